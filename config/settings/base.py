@@ -1,3 +1,4 @@
+from datetime import timedelta
 from pathlib import Path
 
 import environ
@@ -39,6 +40,7 @@ INSTALLED_APPS = [
     "spotify_analytics.users",
     "spotify_analytics.imports",
     "spotify_analytics.analytics",
+    "spotify_analytics.spotify",
 ]
 
 SOCIALACCOUNT_STORE_TOKENS = True
@@ -153,9 +155,65 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 SPOTIFY_CLIENT_ID = env("SPOTIFY_CLIENT_ID")
 SPOTIFY_CLIENT_SECRET = env("SPOTIFY_CLIENT_SECRET")
+SPOTIFY_API_URL = env("SPOTIFY_API_URL", default="https://api.spotify.com/v1")
+SPOTIFY_ACCOUNTS_URL = env("SPOTIFY_ACCOUNTS_URL", default="https://accounts.spotify.com")
+SPOTIFY_MAX_CONNECTIONS = env.int("SPOTIFY_MAX_CONNECTIONS", default=20)
+SPOTIFY_MAX_CONCURRENCY = env.int("SPOTIFY_MAX_CONCURRENCY", default=8)
+SPOTIFY_REQUEST_TIMEOUT = env.int("SPOTIFY_REQUEST_TIMEOUT", default=10)
+SPOTIFY_MAX_RETRIES = env.int("SPOTIFY_MAX_RETRIES", default=4)
+SPOTIFY_RATE_LIMIT_ENABLED = env.bool("SPOTIFY_RATE_LIMIT_ENABLED", default=True)
+SPOTIFY_RATE_LIMIT_PER_SECOND = env.int("SPOTIFY_RATE_LIMIT_PER_SECOND", default=10)
+SPOTIFY_RATE_LIMIT_BURST = env.int("SPOTIFY_RATE_LIMIT_BURST", default=20)
+SPOTIFY_COALESCE_FETCHES = env.bool("SPOTIFY_COALESCE_FETCHES", default=True)
+SPOTIFY_COALESCE_WAIT = env.int("SPOTIFY_COALESCE_WAIT", default=30)
+SPOTIFY_COALESCE_RESULT_TTL = env.int("SPOTIFY_COALESCE_RESULT_TTL", default=300)
 
 REDIS_URL = env("REDIS_URL")
 
+# The catalog alias should point at a Redis with a maxmemory limit and a
+# volatile-lru/allkeys-lru policy; every catalog key carries a TTL.
+CACHES = {
+    "default": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": REDIS_URL,
+    },
+    "catalog": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": env("CATALOG_CACHE_URL", default=REDIS_URL),
+        "KEY_PREFIX": "catalog",
+    },
+    "analytics": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": env("ANALYTICS_CACHE_URL", default=REDIS_URL),
+        "KEY_PREFIX": "analytics",
+    },
+}
+
+CATALOG_CACHE_TTL = env.int("CATALOG_CACHE_TTL", default=7 * 24 * 60 * 60)
+CATALOG_NEGATIVE_CACHE_TTL = env.int("CATALOG_NEGATIVE_CACHE_TTL", default=24 * 60 * 60)
+CATALOG_LOCAL_CACHE_SIZE = env.int("CATALOG_LOCAL_CACHE_SIZE", default=100_000)
+CATALOG_ENRICH_BATCH = env.int("CATALOG_ENRICH_BATCH", default=1000)
+CATALOG_ENRICH_MAX_AGE = timedelta(days=env.int("CATALOG_ENRICH_MAX_AGE_DAYS", default=30))
+
+ANALYTICS_CACHE_ENABLED = env.bool("ANALYTICS_CACHE_ENABLED", default=True)
+ANALYTICS_CACHE_TTL = env.int("ANALYTICS_CACHE_TTL", default=7 * 24 * 60 * 60)
+# URL names of the analytics endpoints rendered into the cache right after an import.
+ANALYTICS_CACHE_WARM_ENDPOINTS = env.list(
+    "ANALYTICS_CACHE_WARM_ENDPOINTS",
+    default=["summary", "overview", "platforms", "listening_activity_by_hour", "artist_share"],
+)
+
+RECENTLY_PLAYED_SYNC_INTERVAL = env.int("RECENTLY_PLAYED_SYNC_INTERVAL", default=30 * 60)
+RECENTLY_PLAYED_SYNC_BATCH = env.int("RECENTLY_PLAYED_SYNC_BATCH", default=100)
+# Share of SPOTIFY_RATE_LIMIT_PER_SECOND the sync may use, leaving the rest
+# to imports, and the Web API requests one user's sync is expected to take
+# (a page of plays plus the odd track lookup).
+RECENTLY_PLAYED_SYNC_RATE_SHARE = env.float("RECENTLY_PLAYED_SYNC_RATE_SHARE", default=0.5)
+RECENTLY_PLAYED_SYNC_REQUESTS_PER_USER = env.int("RECENTLY_PLAYED_SYNC_REQUESTS_PER_USER", default=2)
+# Seconds between a recently-played played_at (ms) and an export ts (s) of
+# the same play.
+LISTEN_MATCH_TOLERANCE = env.int("LISTEN_MATCH_TOLERANCE", default=10)
+
 if USE_TZ:
     CELERY_TIMEZONE = TIME_ZONE
 
@@ -170,5 +228,28 @@ CELERY_RESULT_BACKEND_ALWAYS_RETRY = True
 CELERY_RESULT_BACKEND_MAX_RETRIES = 10
 CELERY_TASK_ALWAYS_EAGER = False
 CELERY_TASK_EAGER_PROPAGATES = False
+CELERY_BEAT_SCHEDULE = {
+    "enrich-catalog": {
+        "task": "spotify_analytics.spotify.tasks.enrich_catalog",
+        "schedule": env.int("CATALOG_ENRICH_INTERVAL", default=5 * 60),
+    },
+    "sync-recently-played": {
+        "task": "spotify_analytics.spotify.tasks.schedule_recently_played_sync",
+        "schedule": RECENTLY_PLAYED_SYNC_INTERVAL,
+    },
+    "create-history-partitions": {
+        "task": "spotify_analytics.core.tasks.create_history_partitions",
+        "schedule": 24 * 60 * 60,
+    },
+}
+
+IMPORT_VALIDATION_SAMPLE_ROWS = env.int("IMPORT_VALIDATION_SAMPLE_ROWS", default=100)
+IMPORT_PARSE_BATCH_SIZE = env.int("IMPORT_PARSE_BATCH_SIZE", default=5000)
+IMPORT_CHUNK_SIZE = env.int("IMPORT_CHUNK_SIZE", default=5000)
+IMPORT_WRITE_BATCH_SIZE = env.int("IMPORT_WRITE_BATCH_SIZE", default=5000)
+IMPORT_CHUNK_CONCURRENCY = env.int("IMPORT_CHUNK_CONCURRENCY", default=4)
+# Automatic retries of a chunk after a deadlock or another OperationalError.
+IMPORT_CHUNK_MAX_RETRIES = env.int("IMPORT_CHUNK_MAX_RETRIES", default=3)
 
 GEOIP_PATH = os.path.join(BASE_DIR, 'geoip')
+GEOIP_CACHE_SIZE = env.int("GEOIP_CACHE_SIZE", default=100_000)
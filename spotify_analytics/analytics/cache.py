@@ -0,0 +1,104 @@
+import hashlib
+import time
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import response
+
+from spotify_analytics.spotify.stats import MinuteCounters
+
+
+class AnalyticsResponseCache:
+    """
+    Analytics responses cached per user under the user's data version.
+
+    The version is bumped whenever the user's listens change (see
+    analytics/rollups.py), which orphans every response cached before; the
+    TTL only keeps abandoned versions from piling up in Redis.
+    """
+
+    def __init__(self, alias="analytics"):
+        self.alias = alias
+        self.counters = MinuteCounters("analytics:cache:stats", alias)
+
+    @property
+    def enabled(self):
+        return settings.ANALYTICS_CACHE_ENABLED
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def version_key(self, user_id):
+        return f"version:{user_id}"
+
+    def version(self, user_id):
+        key = self.version_key(user_id)
+        version = self.cache.get(key)
+        if version is None:
+            # Start from the clock rather than 1, so a version lost to
+            # eviction can't come back and match responses cached under it.
+            self.cache.add(key, time.time_ns(), timeout=None)
+            version = self.cache.get(key)
+        return version
+
+    def bump(self, user_id):
+        if not self.enabled:
+            return
+        try:
+            self.cache.incr(self.version_key(user_id))
+        except ValueError:
+            self.cache.add(self.version_key(user_id), time.time_ns(), timeout=None)
+
+    def response_key(self, user_id, version, endpoint, params):
+        query = urlencode(sorted(params.lists()), doseq=True)
+        digest = hashlib.blake2b(query.encode(), digest_size=8).hexdigest()
+        return f"response:{user_id}:{version}:{endpoint}:{digest}"
+
+    def fetch(self, request, endpoint, render):
+        """Return the cached response to ``request`` or ``render()`` and cache it."""
+        if not self.enabled:
+            return render()
+
+        # Read the version before rendering: if listens change meanwhile,
+        # the response lands under the old version and is never served.
+        version = self.version(request.user.id)
+        key = self.response_key(request.user.id, version, endpoint, request.query_params)
+
+        data = self.cache.get(key)
+        if data is not None:
+            self.counters.incr({f"{endpoint}:hits": 1})
+            return response.Response(data)
+
+        result = render()
+        if result.status_code == 200:
+            self.cache.set(key, result.data, timeout=settings.ANALYTICS_CACHE_TTL)
+        self.counters.incr({f"{endpoint}:misses": 1})
+        return result
+
+    def stats(self, minutes=60):
+        """Return ``{endpoint: {"hits", "misses", "hit_rate"}}`` over the last ``minutes``."""
+        endpoints = {}
+        for _, counters in self.counters.read(minutes):
+            for field, value in counters.items():
+                endpoint, counter = field.rsplit(":", 1)
+                endpoints.setdefault(endpoint, {"hits": 0, "misses": 0})[counter] += value
+
+        for counters in endpoints.values():
+            counters["hit_rate"] = round(counters["hits"] / (counters["hits"] + counters["misses"]), 3)
+        return endpoints
+
+
+response_cache = AnalyticsResponseCache()
+
+
+def cached_response(endpoint):
+    """Serve an APIView's ``get`` through response_cache under ``endpoint``."""
+    def decorator(get):
+        @wraps(get)
+        def wrapper(view, request, *args, **kwargs):
+            return response_cache.fetch(request, endpoint, lambda: get(view, request, *args, **kwargs))
+        return wrapper
+    return decorator
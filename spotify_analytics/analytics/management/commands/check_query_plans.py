@@ -0,0 +1,86 @@
+import json
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from spotify_analytics.analytics.models import HourlyRollup, TrackRollup
+from spotify_analytics.analytics.urls import urlpatterns
+from spotify_analytics.core.models import ListeningHistory
+from spotify_analytics.users.models import User
+
+TABLES = tuple(model._meta.db_table for model in (ListeningHistory, HourlyRollup, TrackRollup))
+
+
+def table_scans(plan):
+    """Yield every plan node that reads the checked tables or one of their partitions."""
+    if plan.get("Relation Name", "").startswith(TABLES):
+        yield plan
+    for child in plan.get("Plans", []):
+        yield from table_scans(child)
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN every query the analytics endpoints run against listening history "
+        "and its rollups and fail if any of them can only be answered by a sequential scan (PostgreSQL only). "
+        "Sequential scans are disabled while planning, so the check doesn't depend on "
+        "how much data the database holds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="Username to run the endpoints as (default: any user with history).")
+
+    def handle(self, *args, user, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("check_query_plans requires a PostgreSQL database.")
+
+        if user:
+            user = User.objects.get(username=user)
+        else:
+            user_id = ListeningHistory.objects.values_list("user_id", flat=True).first()
+            if user_id is None:
+                raise CommandError("No listening history to check against.")
+            user = User.objects.get(id=user_id)
+
+        factory = APIRequestFactory()
+        failures = []
+
+        for pattern in urlpatterns:
+            request = factory.get("/")
+            force_authenticate(request, user=user)
+
+            with override_settings(ANALYTICS_CACHE_ENABLED=False), CaptureQueriesContext(connection) as queries:
+                try:
+                    pattern.callback(request).render()
+                except Exception as e:
+                    self.stderr.write(f"{pattern.name}: endpoint failed ({e}), checking the queries it ran")
+
+            scans = Counter()
+            for query in queries.captured_queries:
+                if not any(table in query["sql"] for table in TABLES):
+                    continue
+
+                with transaction.atomic(), connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+                    cursor.execute("EXPLAIN (FORMAT JSON) " + query["sql"])
+                    plan = cursor.fetchone()[0]
+                    if isinstance(plan, str):
+                        plan = json.loads(plan)
+
+                for node in table_scans(plan[0]["Plan"]):
+                    scans[node["Node Type"]] += 1
+                    if node["Node Type"] == "Seq Scan":
+                        failures.append(f"{pattern.name}: Seq Scan on {node['Relation Name']}")
+
+            summary = ", ".join(f"{count} x {node_type}" for node_type, count in scans.most_common())
+            if "Seq Scan" in scans:
+                self.stdout.write(self.style.ERROR(f"{pattern.name}: {summary}"))
+            else:
+                self.stdout.write(f"{pattern.name}: {summary or 'no history queries'}")
+
+        if failures:
+            raise CommandError("Sequential scans:\n" + "\n".join(failures))
+        self.stdout.write(self.style.SUCCESS("Every analytics query uses an index."))
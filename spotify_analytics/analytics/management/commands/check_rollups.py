@@ -0,0 +1,55 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+from spotify_analytics.analytics.rollups import (
+    hourly_mismatches,
+    refresh_rollups,
+    sketch_mismatches,
+    track_mismatches,
+)
+from spotify_analytics.users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the listening rollups with raw listening history. With --fix the "
+        "days and tracks that differ are rebuilt, which also backfills users without rollups "
+        "or distinct-count sketches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="Only check this username.")
+        parser.add_argument("--fix", action="store_true", help="Rebuild the days and tracks that differ.")
+
+    def handle(self, *args, user, fix, **options):
+        user_id = User.objects.get(username=user).id if user else None
+
+        days = self.report("days", hourly_mismatches(user_id), options["verbosity"])
+        tracks = self.report("tracks", track_mismatches(user_id), options["verbosity"])
+        for mismatch_user_id, sketch_days in self.report(
+            "sketched days", sketch_mismatches(user_id), options["verbosity"]
+        ).items():
+            days[mismatch_user_id] |= sketch_days
+
+        if not days and not tracks:
+            self.stdout.write(self.style.SUCCESS("Rollups match listening history."))
+            return
+        if not fix:
+            raise CommandError("Rollups are out of date; rerun with --fix to rebuild them.")
+
+        for mismatch_user_id in days.keys() | tracks.keys():
+            written = refresh_rollups(mismatch_user_id, days[mismatch_user_id], tracks[mismatch_user_id])
+            self.stdout.write(f"Rebuilt user {mismatch_user_id}: {written} rollup rows.")
+        self.stdout.write(self.style.SUCCESS("Rollups rebuilt."))
+
+    def report(self, kind, mismatches, verbosity):
+        by_user = defaultdict(set)
+        for (user_id, key), (raw, rolled_up) in mismatches.items():
+            by_user[user_id].add(key)
+            if verbosity > 1:
+                self.stdout.write(f"{user_id} {key}: raw {raw}, rollup {rolled_up}")
+
+        if mismatches:
+            self.stdout.write(f"{len(mismatches)} {kind} of {len(by_user)} users differ.")
+        return by_user
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('core', '0014_listeninghistory_covering_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HourlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('streams', models.PositiveIntegerField()),
+                ('ms_played', models.PositiveBigIntegerField()),
+                ('skips', models.PositiveIntegerField()),
+                ('shuffles', models.PositiveIntegerField()),
+                ('unflagged', models.PositiveIntegerField()),
+                ('platform', models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='core.platform')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'hour', 'platform'), name='unique_hourlyrollup_user_hour_platform', nulls_distinct=False)],
+            },
+        ),
+        migrations.CreateModel(
+            name='TrackRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('streams', models.PositiveIntegerField()),
+                ('ms_played', models.PositiveBigIntegerField()),
+                ('first_played_at', models.DateTimeField()),
+                ('last_played_at', models.DateTimeField()),
+                ('track', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.track')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'track'), name='unique_trackrollup_user_track')],
+            },
+        ),
+    ]
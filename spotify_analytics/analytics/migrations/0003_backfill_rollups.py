@@ -0,0 +1,48 @@
+import logging
+
+from celery import current_app
+from django.db import migrations, transaction
+from django.db.models import Exists, OuterRef
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_backfill(user_ids):
+    for user_id in user_ids:
+        current_app.send_task("spotify_analytics.analytics.tasks.backfill_rollups", args=[user_id])
+
+
+def backfill_rollups(apps, schema_editor):
+    # Users with history but no rollups listened before the rollups existed.
+    # Building them is left to a worker so the migration stays quick; the
+    # tasks are sent by name so they run against the code of the day.
+    User = apps.get_model("users", "User")
+    ListeningHistory = apps.get_model("core", "ListeningHistory")
+    HourlyRollup = apps.get_model("analytics", "HourlyRollup")
+
+    user_ids = [
+        str(user_id)
+        for user_id in User.objects.filter(
+            Exists(ListeningHistory.objects.filter(user=OuterRef("pk"))),
+            ~Exists(HourlyRollup.objects.filter(user=OuterRef("pk"))),
+        ).values_list("id", flat=True)
+    ]
+    if user_ids:
+        logger.warning(
+            "Backfilling rollups of %s users in the background; if no worker picks them up, "
+            "run `manage.py check_rollups --fix`.",
+            len(user_ids),
+        )
+        transaction.on_commit(lambda: enqueue_backfill(user_ids), robust=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0002_daily_and_user_sketches'),
+        ('core', '0016_listeninghistory_source'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
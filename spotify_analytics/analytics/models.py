@@ -1,3 +1,103 @@
+from django.conf import settings
 from django.db import models
 
-# Create your models here.
+from spotify_analytics.core.models import Platform, Track
+
+
+# Listening history pre-aggregated for the analytics endpoints; kept up to
+# date by analytics/rollups.py whenever listens are written.
+
+
+class HourlyRollup(models.Model):
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        db_index=False,
+        related_name="+"
+    )
+    # Start of the UTC hour the listens were played in.
+    hour = models.DateTimeField()
+    platform = models.ForeignKey(
+        Platform,
+        on_delete=models.PROTECT,
+        null=True,
+        db_index=False,
+        related_name="+"
+    )
+    streams = models.PositiveIntegerField()
+    ms_played = models.PositiveBigIntegerField()
+    skips = models.PositiveIntegerField()
+    shuffles = models.PositiveIntegerField()
+    # Listens synced from the recently-played API, which don't say whether
+    # they were skipped or shuffled.
+    unflagged = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "hour", "platform"],
+                name="unique_hourlyrollup_user_hour_platform",
+                nulls_distinct=False,
+            ),
+        ]
+
+
+class TrackRollup(models.Model):
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        db_index=False,
+        related_name="+"
+    )
+    track = models.ForeignKey(Track, on_delete=models.CASCADE, related_name="+")
+    streams = models.PositiveIntegerField()
+    ms_played = models.PositiveBigIntegerField()
+    first_played_at = models.DateTimeField()
+    last_played_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "track"],
+                name="unique_trackrollup_user_track",
+            ),
+        ]
+
+
+# HyperLogLog sketches (analytics/sketches.py) of the distinct tracks,
+# albums and artists listened to, zlib-compressed.
+
+
+class DailySketch(models.Model):
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        db_index=False,
+        related_name="+"
+    )
+    # UTC date the listens were played on.
+    day = models.DateField()
+    tracks = models.BinaryField()
+    albums = models.BinaryField()
+    artists = models.BinaryField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "day"],
+                name="unique_dailysketch_user_day",
+            ),
+        ]
+
+
+class UserSketch(models.Model):
+    """All of the user's day sketches merged."""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="+"
+    )
+    tracks = models.BinaryField()
+    albums = models.BinaryField()
+    artists = models.BinaryField()
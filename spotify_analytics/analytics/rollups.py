@@ -0,0 +1,373 @@
+"""
+Rollup maintenance. Whenever listens are written, the days they fall on
+(and the tracks played on those days) are recomputed from
+ListeningHistory, so the rollups never drift from raw data however the
+listens got there. The distinct-count sketches of those days are rebuilt
+along with them.
+"""
+from datetime import datetime, time, timedelta, timezone
+from functools import cache, reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q, Sum
+from django.db.models.functions import TruncDate, TruncHour
+
+from spotify_analytics.analytics.cache import response_cache
+from spotify_analytics.analytics.models import DailySketch, HourlyRollup, TrackRollup, UserSketch
+from spotify_analytics.analytics.sketches import HyperLogLog, register_of
+from spotify_analytics.core.loaders import bulk_load
+from spotify_analytics.core.models import ListeningHistory, Track
+from spotify_analytics.users.models import User
+
+HOURLY_COUNTERS = ("streams", "ms_played", "skips", "shuffles", "unflagged")
+TRACK_COUNTERS = ("streams", "ms_played", "first_played_at", "last_played_at")
+SKETCHES = ("tracks", "albums", "artists")
+
+# Day ranges OR-ed into a single query.
+RANGES_PER_QUERY = 100
+TRACKS_PER_QUERY = 5000
+
+
+def hourly_counters():
+    return {
+        "streams": Count("id"),
+        "ms_played": Sum("ms_played"),
+        "skips": Count("id", filter=Q(skipped=True)),
+        "shuffles": Count("id", filter=Q(shuffle=True)),
+        "unflagged": Count("id", filter=Q(skipped__isnull=True)),
+    }
+
+
+def track_counters():
+    return {
+        "streams": Count("id"),
+        "ms_played": Sum("ms_played"),
+        "first_played_at": Min("played_at"),
+        "last_played_at": Max("played_at"),
+    }
+
+
+def day_ranges(days):
+    """Merge UTC dates into ``[start, stop)`` datetime ranges of consecutive days."""
+    ranges = []
+    for day in sorted(set(days)):
+        start = datetime.combine(day, time.min, tzinfo=timezone.utc)
+        if ranges and ranges[-1][1] == start:
+            ranges[-1][1] = start + timedelta(days=1)
+        else:
+            ranges.append([start, start + timedelta(days=1)])
+    return ranges
+
+
+def in_ranges(field, ranges):
+    return reduce(or_, (Q(**{f"{field}__gte": start, f"{field}__lt": stop}) for start, stop in ranges))
+
+
+def lock_user(user_id):
+    # Two refreshes of the same user would otherwise delete each other's
+    # rows and collide on insert.
+    User.objects.select_for_update().filter(id=user_id).exists()
+    # Cached analytics of the user go stale once the new rollups commit.
+    transaction.on_commit(lambda: response_cache.bump(user_id))
+
+
+def refresh_rollups(user_id, days, track_ids=()):
+    """
+    Recompute the user's hourly rollups for ``days`` (UTC dates) and the
+    track rollups of every track played on them, plus ``track_ids``.
+    Returns the number of rollup rows written.
+    """
+    ranges = day_ranges(days)
+    track_ids = set(track_ids)
+    if not ranges and not track_ids:
+        return 0
+
+    written = 0
+    with transaction.atomic():
+        lock_user(user_id)
+
+        for i in range(0, len(ranges), RANGES_PER_QUERY):
+            batch = ranges[i:i + RANGES_PER_QUERY]
+            listens = ListeningHistory.objects.filter(in_ranges("played_at", batch), user_id=user_id)
+
+            HourlyRollup.objects.filter(in_ranges("hour", batch), user_id=user_id).delete()
+            rows = (
+                listens
+                .annotate(hour=TruncHour("played_at", tzinfo=timezone.utc))
+                .values("hour", "platform_id")
+                .annotate(**hourly_counters())
+                .order_by()
+                .values_list("hour", "platform_id", *HOURLY_COUNTERS)
+            )
+            written += bulk_load(
+                HourlyRollup,
+                ("user_id", "hour", "platform_id", *HOURLY_COUNTERS),
+                ((user_id, *row) for row in rows.iterator()),
+            )
+
+            track_ids.update(listens.order_by().values_list("track_id", flat=True).distinct())
+
+        written += refresh_track_rollups(user_id, track_ids)
+        if ranges:
+            written += refresh_sketches(user_id, ranges)
+
+    return written
+
+
+def refresh_track_rollups(user_id, track_ids):
+    """Recompute the user's rollups of ``track_ids`` over their whole history."""
+    track_ids = list(track_ids)
+    written = 0
+    with transaction.atomic():
+        lock_user(user_id)
+
+        for i in range(0, len(track_ids), TRACKS_PER_QUERY):
+            batch = track_ids[i:i + TRACKS_PER_QUERY]
+
+            TrackRollup.objects.filter(user_id=user_id, track_id__in=batch).delete()
+            rows = (
+                ListeningHistory.objects
+                .filter(user_id=user_id, track_id__in=batch)
+                .values("track_id")
+                .annotate(**track_counters())
+                .order_by()
+                .values_list("track_id", *TRACK_COUNTERS)
+            )
+            written += bulk_load(
+                TrackRollup,
+                ("user_id", "track_id", *TRACK_COUNTERS),
+                ((user_id, *row) for row in rows.iterator()),
+            )
+
+    return written
+
+
+def catalog_of(track_ids):
+    """``{track_id: (album_id, [artist_ids])}`` for ``track_ids``."""
+    track_ids = list(track_ids)
+    catalog = {}
+    for i in range(0, len(track_ids), TRACKS_PER_QUERY):
+        batch = track_ids[i:i + TRACKS_PER_QUERY]
+        for track_id, album_id in Track.objects.filter(id__in=batch).values_list("id", "album_id"):
+            catalog[track_id] = (album_id, [])
+        for track_id, artist_id in (
+            Track.artists.through.objects.filter(track_id__in=batch).values_list("track_id", "artist_id")
+        ):
+            catalog[track_id][1].append(artist_id)
+    return catalog
+
+
+def load_sketches(rows):
+    return {key: dict(zip(SKETCHES, map(HyperLogLog.from_bytes, sketches))) for key, *sketches in rows}
+
+
+def refresh_sketches(user_id, ranges):
+    """
+    Rebuild the user's day sketches over ``ranges`` (as given by
+    day_ranges()) and fold them into the user's all-time sketch.
+    Returns the number of day sketches written.
+    """
+    day_filter = in_ranges("day", [(start.date(), stop.date()) for start, stop in ranges])
+    tracks_by_day = {}
+    with transaction.atomic():
+        lock_user(user_id)
+
+        for i in range(0, len(ranges), RANGES_PER_QUERY):
+            rows = (
+                ListeningHistory.objects
+                .filter(in_ranges("played_at", ranges[i:i + RANGES_PER_QUERY]), user_id=user_id)
+                .annotate(day=TruncDate("played_at", tzinfo=timezone.utc))
+                .order_by()
+                .values_list("day", "track_id")
+                .distinct()
+            )
+            for day, track_id in rows.iterator():
+                tracks_by_day.setdefault(day, set()).add(track_id)
+
+        catalog = catalog_of(set().union(*tracks_by_day.values()))
+        # Tracks, albums and artists recur day after day; hash each once.
+        register = cache(register_of)
+
+        days = {}
+        for day, track_ids in tracks_by_day.items():
+            sketches = days[day] = {name: HyperLogLog() for name in SKETCHES}
+            for track_id in track_ids:
+                sketches["tracks"].add(register(track_id))
+                album_id, artist_ids = catalog.get(track_id, (None, ()))
+                if album_id is not None:
+                    sketches["albums"].add(register(album_id))
+                for artist_id in artist_ids:
+                    sketches["artists"].add(register(artist_id))
+
+        old_days = load_sketches(
+            DailySketch.objects.filter(day_filter, user_id=user_id).values_list("day", *SKETCHES).iterator()
+        )
+        DailySketch.objects.filter(day_filter, user_id=user_id).delete()
+        DailySketch.objects.bulk_create(
+            [
+                DailySketch(user_id=user_id, day=day, **{name: sketch.to_bytes() for name, sketch in sketches.items()})
+                for day, sketches in days.items()
+            ],
+            batch_size=1000,
+        )
+
+        # Sketches can't forget items, so the all-time sketch only takes the
+        # new days merged in as long as no day lost any; otherwise (listens
+        # were removed) it's merged again from every day.
+        grown = all(
+            day in days and days[day][name].covers(sketch)
+            for day, sketches in old_days.items()
+            for name, sketch in sketches.items()
+        )
+        user_sketch = load_sketches(
+            UserSketch.objects.filter(user_id=user_id).values_list("user_id", *SKETCHES)
+        ).get(user_id)
+        if grown and user_sketch:
+            merge = [user_sketch, *days.values()]
+        else:
+            merge = load_sketches(
+                DailySketch.objects.filter(user_id=user_id).values_list("day", *SKETCHES).iterator()
+            ).values()
+        merged = {name: HyperLogLog.merged(sketches[name] for sketches in merge) for name in SKETCHES}
+        UserSketch.objects.update_or_create(
+            user_id=user_id,
+            defaults={name: sketch.to_bytes() for name, sketch in merged.items()},
+        )
+
+    return len(days)
+
+
+def day_sketches(user_id, start=None, stop=None):
+    """``(day, tracks, albums, artists)`` sketch rows of the user's UTC days ``[start, stop)``."""
+    rows = DailySketch.objects.filter(user_id=user_id)
+    if start is not None:
+        rows = rows.filter(day__gte=start)
+    if stop is not None:
+        rows = rows.filter(day__lt=stop)
+    return rows.values_list("day", *SKETCHES).iterator()
+
+
+def distinct_counts(user_id, start=None, stop=None):
+    """
+    Estimated ``{"tracks", "albums", "artists"}`` counts of the user's
+    listens on UTC days ``[start, stop)``, or over the whole history
+    without a window. See analytics/sketches.py for the error bounds.
+    """
+    if start is None and stop is None:
+        rows = UserSketch.objects.filter(user_id=user_id).values_list("user_id", *SKETCHES)
+    else:
+        rows = day_sketches(user_id, start, stop)
+
+    merge = load_sketches(rows).values()
+    return {name: HyperLogLog.merged(sketches[name] for sketches in merge).count() for name in SKETCHES}
+
+
+def period_start(day, granularity):
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+def distinct_counts_by_period(user_id, granularity, start=None, stop=None):
+    """``distinct_counts()`` of each "day", "week" or "month" period, by its start date."""
+    periods = {}
+    for day, sketches in load_sketches(day_sketches(user_id, start, stop)).items():
+        periods.setdefault(period_start(day, granularity), []).append(sketches)
+    return {
+        period: {name: HyperLogLog.merged(sketches[name] for sketches in merge).count() for name in SKETCHES}
+        for period, merge in periods.items()
+    }
+
+
+def _mismatches(raw, rolled_up):
+    return {
+        key: (raw.get(key), rolled_up.get(key))
+        for key in raw.keys() | rolled_up.keys()
+        if raw.get(key) != rolled_up.get(key)
+    }
+
+
+def _totals(queryset, group_by, counters):
+    names = list(counters)
+    return {
+        (row[0], row[1]): dict(zip(names, row[2:]))
+        for row in (
+            queryset
+            .values("user_id", group_by)
+            .annotate(**counters)
+            .order_by()
+            .values_list("user_id", group_by, *names)
+        )
+    }
+
+
+def hourly_mismatches(user_id=None):
+    """
+    Compare per-day totals of the hourly rollups with raw listening history
+    and return ``{(user_id, day): (raw, rolled_up)}`` for the days that differ.
+    """
+    history = ListeningHistory.objects.all()
+    rollups = HourlyRollup.objects.all()
+    if user_id is not None:
+        history = history.filter(user_id=user_id)
+        rollups = rollups.filter(user_id=user_id)
+
+    return _mismatches(
+        _totals(
+            history.annotate(day=TruncDate("played_at", tzinfo=timezone.utc)),
+            "day",
+            hourly_counters(),
+        ),
+        _totals(
+            rollups.annotate(day=TruncDate("hour", tzinfo=timezone.utc)),
+            "day",
+            {name: Sum(name) for name in HOURLY_COUNTERS},
+        ),
+    )
+
+
+def track_mismatches(user_id=None):
+    """
+    Compare the track rollups with raw listening history and return
+    ``{(user_id, track_id): (raw, rolled_up)}`` for the tracks that differ.
+    """
+    history = ListeningHistory.objects.all()
+    rollups = TrackRollup.objects.all()
+    if user_id is not None:
+        history = history.filter(user_id=user_id)
+        rollups = rollups.filter(user_id=user_id)
+
+    return _mismatches(
+        _totals(history, "track_id", track_counters()),
+        {
+            (row[0], row[1]): dict(zip(TRACK_COUNTERS, row[2:]))
+            for row in rollups.values_list("user_id", "track_id", *TRACK_COUNTERS)
+        },
+    )
+
+
+def sketch_mismatches(user_id=None):
+    """
+    Return ``{(user_id, day): (listened, sketched)}`` for the days that have
+    listens but no sketch, or a sketch but no listens.
+    """
+    history = ListeningHistory.objects.all()
+    sketches = DailySketch.objects.all()
+    if user_id is not None:
+        history = history.filter(user_id=user_id)
+        sketches = sketches.filter(user_id=user_id)
+
+    return _mismatches(
+        dict.fromkeys(
+            history
+            .annotate(day=TruncDate("played_at", tzinfo=timezone.utc))
+            .order_by()
+            .values_list("user_id", "day")
+            .distinct(),
+            True,
+        ),
+        dict.fromkeys(sketches.values_list("user_id", "day"), True),
+    )
@@ -0,0 +1,111 @@
+"""
+HyperLogLog sketches of the distinct tracks, albums and artists a user
+listened to, one per UTC day plus one for the whole history. The count
+over any window of days is the count of the merged day sketches.
+
+Error bounds: with 2**14 registers the relative standard error is
+1.04 / sqrt(2**14) ~= 0.81%, so about 95% of estimates land within 1.6%
+of the exact count and 99.7% within 2.4%, at any cardinality; small
+counts (up to a few hundred items) usually come out exact.
+"""
+import hashlib
+import math
+import zlib
+
+PRECISION = 14
+REGISTERS = 1 << PRECISION
+HASH_BITS = 64
+
+# Registers never exceed 51, so in 8-bit lanes the top bit is free to
+# carry per-lane comparisons when merging whole sketches as one integer.
+_high_bits = int.from_bytes(b"\x80" * REGISTERS, "little")
+_all_bits = (1 << (8 * REGISTERS)) - 1
+
+
+def _sigma(x):
+    if x == 1:
+        return math.inf
+    y, z = 1, x
+    while True:
+        x *= x
+        z, previous = z + x * y, z
+        y += y
+        if z == previous:
+            return z
+
+
+def _tau(x):
+    if x in (0, 1):
+        return 0
+    y, z = 1, 1 - x
+    while True:
+        x = math.sqrt(x)
+        y *= 0.5
+        z, previous = z - (1 - x) ** 2 * y, z
+        if z == previous:
+            return z / 3
+
+
+def register_of(pk):
+    """``(register index, rank)`` a UUID primary key sets."""
+    h = int.from_bytes(hashlib.blake2b(pk.bytes, digest_size=8).digest(), "big")
+    rest = h & ((1 << (HASH_BITS - PRECISION)) - 1)
+    return h >> (HASH_BITS - PRECISION), HASH_BITS - PRECISION - rest.bit_length() + 1
+
+
+class HyperLogLog:
+    def __init__(self, registers=None):
+        self.registers = registers if registers is not None else bytearray(REGISTERS)
+
+    def add(self, register):
+        index, rank = register
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, other):
+        """Merge ``other`` into this sketch (register-wise max)."""
+        a = int.from_bytes(self.registers, "little")
+        b = int.from_bytes(other.registers, "little")
+        # Lanes where a >= b keep their top bit after (a + 128) - b.
+        a_wins = (((a | _high_bits) - b) & _high_bits) >> 7
+        mask = a_wins * 0xFF
+        merged = (a & mask) | (b & (_all_bits ^ mask))
+        self.registers = bytearray(merged.to_bytes(REGISTERS, "little"))
+
+    def covers(self, other):
+        """Whether no register of ``other`` is higher than this sketch's."""
+        merged = HyperLogLog(bytearray(self.registers))
+        merged.update(other)
+        return merged.registers == self.registers
+
+    def count(self):
+        zeros = self.registers.count(0)
+        if zeros >= REGISTERS // 2:
+            # Linear counting: as accurate below ~11k items (HLL++ switches
+            # over at the same point) and cheaper than a register histogram.
+            return round(REGISTERS * math.log(REGISTERS / zeros))
+        # Ertl's improved estimator ("New cardinality estimation algorithms
+        # for HyperLogLog sketches", 2017): unbiased without the empirical
+        # bias tables of HLL++.
+        q = HASH_BITS - PRECISION
+        histogram = [self.registers.count(rank) for rank in range(q + 2)]
+        z = REGISTERS * _tau(1 - histogram[q + 1] / REGISTERS)
+        for k in range(q, 0, -1):
+            z = 0.5 * (z + histogram[k])
+        z += REGISTERS * _sigma(histogram[0] / REGISTERS)
+        return round(REGISTERS * REGISTERS / (2 * math.log(2) * z))
+
+    def to_bytes(self):
+        return zlib.compress(bytes(self.registers))
+
+    @classmethod
+    def from_bytes(cls, data):
+        return cls(bytearray(zlib.decompress(data)))
+
+    @classmethod
+    def merged(cls, sketches):
+        sketches = iter(sketches)
+        result = cls(bytearray(next(sketches, cls()).registers))
+        for sketch in sketches:
+            result.update(sketch)
+        return result
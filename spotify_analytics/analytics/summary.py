@@ -0,0 +1,336 @@
+"""
+One-pass listening summary behind the overview and breakdown endpoints.
+
+A single GROUPING SETS query over the user's hourly rollups produces the
+totals, the per-platform and the per-hour-of-day rows at once. The
+distinct track/album/artist counts of the overview are estimated from the
+user's HyperLogLog sketches (within ~2% of the exact counts, see
+analytics/sketches.py); ``exact`` counts them with one more query over
+the track rollups instead. Artist share is likewise a single statement
+that ranks and buckets on the server.
+
+Every query takes an optional ``[start, stop)`` window and a
+``granularity`` ("day", "week" or "month") that splits the results into
+periods of the current timezone, grouped in the same statement.
+"""
+from datetime import datetime, timedelta
+
+from django.db import connection
+from django.utils import timezone
+
+from spotify_analytics.analytics.models import HourlyRollup, TrackRollup
+from spotify_analytics.analytics.rollups import distinct_counts, distinct_counts_by_period
+from spotify_analytics.core.models import Artist, ListeningHistory, Platform, Track
+
+SECTIONS = ("overview", "platforms", "skipped", "shuffle", "activity_by_hour")
+GRANULARITIES = ("day", "week", "month")
+
+MS_IN_MINUTE = 1000 * 60
+MINUTES_IN_HOUR = 60
+
+COUNTERS = ("streams", "ms_played", "skips", "shuffles", "unflagged")
+
+# GROUPING(platform_id, local_hour) of each grouping set.
+GRAND_TOTAL = 0b11
+BY_PLATFORM = 0b01
+BY_HOUR = 0b10
+
+HOURLY_SQL = f"""
+SELECT
+    GROUPING(platform_id, local_hour),
+    period,
+    platform_id,
+    local_hour,
+    {", ".join(f"COALESCE(SUM({name}), 0)::bigint" for name in COUNTERS)}
+FROM (
+    SELECT
+        {{period}} AS period,
+        platform_id,
+        {{local_hour}} AS local_hour,
+        {", ".join(COUNTERS)}
+    FROM ({{source}}) AS source
+) AS rollup
+GROUP BY GROUPING SETS ((period), (period, platform_id), (period, local_hour))
+"""
+
+HOURLY_ROLLUP_SOURCE = f"""
+SELECT platform_id, hour, {", ".join(COUNTERS)}
+FROM {HourlyRollup._meta.db_table}
+WHERE user_id = %s"""
+
+# The same counters straight from listens, for timezones the UTC hours of
+# the rollups don't line up with.
+HOURLY_HISTORY_SOURCE = f"""
+SELECT
+    platform_id,
+    played_at AS hour,
+    1 AS streams,
+    ms_played,
+    (skipped IS TRUE)::integer AS skips,
+    (shuffle IS TRUE)::integer AS shuffles,
+    (skipped IS NULL)::integer AS unflagged
+FROM {ListeningHistory._meta.db_table}
+WHERE user_id = %s"""
+
+CATALOG_SQL = f"""
+SELECT
+    source.period,
+    COUNT(DISTINCT source.track_id),
+    COUNT(DISTINCT track.album_id),
+    COUNT(DISTINCT track_artist.artist_id)
+FROM ({{source}}) AS source
+JOIN {Track._meta.db_table} AS track ON track.id = source.track_id
+LEFT JOIN {Track.artists.through._meta.db_table} AS track_artist ON track_artist.track_id = source.track_id
+GROUP BY source.period
+"""
+
+
+def hour_aligned(tz):
+    """Whether ``tz`` is a whole number of hours off UTC, winter and summer."""
+    year = timezone.now().year
+    return all(
+        datetime(year, month, 1, tzinfo=tz).utcoffset() % timedelta(hours=1) == timedelta(0)
+        for month in (1, 7)
+    )
+
+
+def period_sql(column, granularity):
+    """SQL for the local start date of the ``granularity`` period ``column`` falls in, and its params."""
+    if granularity is None:
+        return "NULL::date", []
+    return f"date_trunc(%s, {column} AT TIME ZONE %s)::date", [granularity, timezone.get_current_timezone_name()]
+
+
+def window_sql(column, start, stop):
+    sql, params = "", []
+    if start is not None:
+        sql += f" AND {column} >= %s"
+        params.append(start)
+    if stop is not None:
+        sql += f" AND {column} < %s"
+        params.append(stop)
+    return sql, params
+
+
+def hourly_breakdown(user, by_hour=True, start=None, stop=None, granularity=None):
+    """
+    Return ``{period: (totals, platforms, hours)}``: the user's totals,
+    per-platform and per-local-hour counters of each period (a single
+    None period without ``granularity``). Converting every hour to local
+    time is the costly part of the query, so it's skipped when the
+    per-hour breakdown isn't needed.
+    """
+    if hour_aligned(timezone.get_current_timezone()):
+        source, column = HOURLY_ROLLUP_SOURCE, "hour"
+    else:
+        source, column = HOURLY_HISTORY_SOURCE, "played_at"
+    window, window_params = window_sql(column, start, stop)
+
+    period, period_params = period_sql("hour", granularity)
+    if by_hour:
+        local_hour, hour_params = "EXTRACT(HOUR FROM hour AT TIME ZONE %s)::integer", [timezone.get_current_timezone_name()]
+    else:
+        local_hour, hour_params = "NULL::integer", []
+
+    breakdown = {}
+    with connection.cursor() as cursor:
+        cursor.execute(
+            HOURLY_SQL.format(period=period, local_hour=local_hour, source=source + window),
+            [*period_params, *hour_params, user.id, *window_params],
+        )
+        for grouping, period, platform_id, local_hour, *values in cursor.fetchall():
+            totals, platforms, hours = breakdown.setdefault(period, (dict.fromkeys(COUNTERS, 0), {}, {}))
+            counters = dict(zip(COUNTERS, values))
+            if grouping == GRAND_TOTAL:
+                totals.update(counters)
+            elif grouping == BY_PLATFORM:
+                platforms[platform_id] = counters
+            elif grouping == BY_HOUR and by_hour:
+                hours[local_hour] = counters
+
+    return breakdown
+
+
+def catalog_counts(user, start=None, stop=None, granularity=None):
+    """Exact ``{period: (tracks, albums, artists)}`` the user listened to."""
+    if start is None and stop is None and granularity is None:
+        source = f"SELECT NULL::date AS period, track_id FROM {TrackRollup._meta.db_table} WHERE user_id = %s"
+        params = [user.id]
+    else:
+        period, params = period_sql("played_at", granularity)
+        window, window_params = window_sql("played_at", start, stop)
+        source = (
+            f"SELECT DISTINCT {period} AS period, track_id FROM {ListeningHistory._meta.db_table} "
+            f"WHERE user_id = %s{window}"
+        )
+        params += [user.id, *window_params]
+
+    with connection.cursor() as cursor:
+        cursor.execute(CATALOG_SQL.format(source=source), params)
+        return {period: tuple(counts) for period, *counts in cursor.fetchall()}
+
+
+def estimated_catalog_counts(user, start=None, stop=None, granularity=None):
+    """
+    ``catalog_counts()`` estimated from the sketches. Day sketches are by
+    UTC date, so windows and periods are cut at UTC rather than local
+    midnight.
+    """
+    days = [None if value is None else timezone.localtime(value).date() for value in (start, stop)]
+    if granularity is not None:
+        counts = distinct_counts_by_period(user.id, granularity, *days)
+    else:
+        counts = {None: distinct_counts(user.id, *days)}
+    return {
+        period: (period_counts["tracks"], period_counts["albums"], period_counts["artists"])
+        for period, period_counts in counts.items()
+    }
+
+
+def flag_counts(totals, flag, counter):
+    """
+    ``[{flag: True/False/None, "count": n}]`` like grouping raw listens by
+    ``flag``, rebuilt from the rollup counters.
+    """
+    flagged = totals[counter]
+    unflagged = totals["unflagged"]
+    counts = {True: flagged, False: totals["streams"] - flagged - unflagged, None: unflagged}
+    return [{flag: value, "count": count} for value, count in counts.items() if count]
+
+
+def section_summary(sections, totals, by_platform, by_hour, catalog, platforms, all_hours=True):
+    summary = {}
+
+    if "overview" in sections:
+        different_tracks, different_albums, different_artists = catalog
+        total_minutes = totals["ms_played"] // MS_IN_MINUTE
+        summary["overview"] = {
+            "total_streams": totals["streams"],
+            "minutes_streamed": total_minutes,
+            "hours_streamed": total_minutes // MINUTES_IN_HOUR,
+            "different_tracks": different_tracks,
+            "different_artists": different_artists,
+            "different_albums": different_albums,
+        }
+
+    if "platforms" in sections:
+        summary["platforms"] = sorted(
+            (
+                {"platform": platforms[pk].name, "count": counters["streams"]}
+                for pk, counters in by_platform.items()
+                if pk is not None
+            ),
+            key=lambda row: -row["count"],
+        )
+
+    if "skipped" in sections:
+        summary["skipped"] = flag_counts(totals, "skipped", "skips")
+
+    if "shuffle" in sections:
+        summary["shuffle"] = flag_counts(totals, "shuffle", "shuffles")
+
+    if "activity_by_hour" in sections:
+        summary["activity_by_hour"] = [
+            {
+                "hour": hour,
+                "streams": by_hour.get(hour, {}).get("streams", 0),
+                "minutes": by_hour.get(hour, {}).get("ms_played", 0) // MS_IN_MINUTE,
+            }
+            for hour in range(24)
+            if all_hours or hour in by_hour
+        ]
+
+    return summary
+
+
+def listening_summary(user, sections=SECTIONS, exact=False, start=None, stop=None, granularity=None):
+    """
+    The requested ``sections`` of the user's listens within ``[start, stop)``.
+    With a ``granularity`` every section becomes a series of entries tagged
+    with the start date of their ``period``; periods (and hours of day)
+    without listens are left out to keep decade-long series small.
+    """
+    breakdown = hourly_breakdown(user, "activity_by_hour" in sections, start, stop, granularity)
+
+    catalog = {}
+    if "overview" in sections:
+        counts = catalog_counts if exact else estimated_catalog_counts
+        catalog = counts(user, start, stop, granularity)
+
+    platforms = {}
+    if "platforms" in sections:
+        platforms = Platform.objects.in_bulk(
+            {pk for _, by_platform, _ in breakdown.values() for pk in by_platform if pk is not None}
+        )
+
+    if granularity is None:
+        totals, by_platform, by_hour = breakdown.get(None, (dict.fromkeys(COUNTERS, 0), {}, {}))
+        return section_summary(sections, totals, by_platform, by_hour, catalog.get(None, (0, 0, 0)), platforms)
+
+    series = {section: [] for section in sections}
+    for period, (totals, by_platform, by_hour) in sorted(breakdown.items()):
+        summary = section_summary(
+            sections, totals, by_platform, by_hour, catalog.get(period, (0, 0, 0)), platforms, all_hours=False
+        )
+        for section, value in summary.items():
+            rows = [value] if isinstance(value, dict) else value
+            series[section].extend({"period": period, **row} for row in rows)
+    return series
+
+
+ARTIST_SHARE_SQL = f"""
+WITH artist_streams AS (
+    SELECT source.period, track_artist.artist_id, SUM(source.streams) AS streams
+    FROM ({{source}}) AS source
+    JOIN {Track.artists.through._meta.db_table} AS track_artist ON track_artist.track_id = source.track_id
+    GROUP BY source.period, track_artist.artist_id
+), ranked AS (
+    SELECT
+        period,
+        artist_id,
+        streams,
+        ROW_NUMBER() OVER (PARTITION BY period ORDER BY streams DESC, artist_id) AS rank
+    FROM artist_streams
+), bucketed AS (
+    SELECT period, CASE WHEN rank <= %s THEN artist_id END AS artist_id, SUM(streams)::bigint AS streams
+    FROM ranked
+    GROUP BY 1, 2
+)
+SELECT bucketed.period, bucketed.artist_id, artist.name, bucketed.streams
+FROM bucketed
+LEFT JOIN {Artist._meta.db_table} AS artist ON artist.id = bucketed.artist_id
+ORDER BY bucketed.period, bucketed.artist_id IS NULL, bucketed.streams DESC, artist.name, bucketed.artist_id
+"""
+
+
+def artist_share(user, limit, start=None, stop=None, granularity=None):
+    """
+    Streams of the user's ``limit`` most played artists plus one "Other"
+    row for everyone else, ranked and bucketed in a single statement
+    (per period with a ``granularity``). Without a ``[start, stop)``
+    window or periods the track rollups are enough; with them, listens
+    are counted from raw history.
+    """
+    if start is None and stop is None and granularity is None:
+        source = f"SELECT NULL::date AS period, track_id, streams FROM {TrackRollup._meta.db_table} WHERE user_id = %s"
+        params = [user.id]
+    else:
+        period, params = period_sql("played_at", granularity)
+        window, window_params = window_sql("played_at", start, stop)
+        source = (
+            f"SELECT {period} AS period, track_id, COUNT(*) AS streams FROM {ListeningHistory._meta.db_table} "
+            f"WHERE user_id = %s{window} GROUP BY 1, 2"
+        )
+        params += [user.id, *window_params]
+
+    with connection.cursor() as cursor:
+        cursor.execute(ARTIST_SHARE_SQL.format(source=source), [*params, limit])
+        return [
+            {
+                **({"period": period} if granularity else {}),
+                "artist_id": artist_id,
+                "track__artists__name": name if artist_id else "Other",
+                "count": streams,
+            }
+            for period, artist_id, name, streams in cursor.fetchall()
+        ]
@@ -0,0 +1,53 @@
+from datetime import timezone
+
+from celery import shared_task
+from celery.utils.log import get_task_logger
+from django.conf import settings
+from django.db.models.functions import TruncDate
+from django.urls import resolve, reverse
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from spotify_analytics.analytics.cache import response_cache
+from spotify_analytics.analytics.rollups import refresh_rollups
+from spotify_analytics.core.models import ListeningHistory
+from spotify_analytics.users.models import User
+
+logger = get_task_logger(__name__)
+
+
+@shared_task(bind=True)
+def warm_analytics_cache(self, user_id):
+    """
+    Render the ANALYTICS_CACHE_WARM_ENDPOINTS with default parameters so the
+    first dashboard load after an import is served from the cache.
+    """
+    if not response_cache.enabled:
+        return
+
+    user = User.objects.get(id=user_id)
+    factory = APIRequestFactory()
+    for name in settings.ANALYTICS_CACHE_WARM_ENDPOINTS:
+        path = reverse(f"analytics:{name}")
+        request = factory.get(path)
+        force_authenticate(request, user=user)
+        resolve(path).func(request).render()
+
+    logger.info("Warmed %s analytics endpoints of user %s", len(settings.ANALYTICS_CACHE_WARM_ENDPOINTS), user_id)
+
+
+@shared_task(bind=True)
+def backfill_rollups(self, user_id):
+    """
+    Build the rollups and sketches of every day the user has listens on,
+    for history written before the rollups existed.
+    """
+    days = (
+        ListeningHistory.objects
+        .filter(user_id=user_id)
+        .annotate(day=TruncDate("played_at", tzinfo=timezone.utc))
+        .values_list("day", flat=True)
+        .distinct()
+    )
+    written = refresh_rollups(user_id, set(days))
+    logger.info("Backfilled %s rollup rows of user %s", written, user_id)
+    return written
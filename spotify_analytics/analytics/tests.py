@@ -0,0 +1,142 @@
+import json
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from django.db import connection, transaction
+from django.db.models import Max, Min, Sum
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from spotify_analytics.analytics.models import HourlyRollup, TrackRollup
+from spotify_analytics.analytics.rollups import refresh_rollups
+from spotify_analytics.analytics.urls import urlpatterns
+from spotify_analytics.core.loaders import bulk_load
+from spotify_analytics.core.models import Album, Artist, ListeningHistory, Track, listening_dedup_key
+from spotify_analytics.core.partitions import ensure_partitions
+from spotify_analytics.users.models import User
+
+TABLES = tuple(model._meta.db_table for model in (ListeningHistory, HourlyRollup, TrackRollup))
+START = datetime(2025, 3, 1, tzinfo=timezone.utc)
+INDEX_SCANS = {"Index Scan", "Index Only Scan", "Bitmap Heap Scan"}
+
+
+def plan_nodes(plan):
+    """Yield every node of an EXPLAIN (FORMAT JSON) plan tree."""
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "Query plans are checked on PostgreSQL only")
+@override_settings(ANALYTICS_CACHE_ENABLED=False)
+class QueryPlanTests(TestCase):
+    """
+    Sequential scans are disabled while planning, so the plans don't depend
+    on how many rows the test database holds: a query that still gets a
+    Seq Scan has no index that can answer it.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="listener")
+        artist = Artist.objects.create(name="Artist", spotify_id="a" * 22, spotify_url="")
+        album = Album.objects.create(name="Album", type="album", spotify_id="b" * 22, spotify_url="")
+        cls.tracks = []
+        for i in range(5):
+            track = Track.objects.create(name=f"Track {i}", spotify_id=f"{i:022d}", spotify_url="", album=album)
+            track.artists.add(artist)
+            cls.tracks.append(track)
+
+        ensure_partitions([START.year])
+        rows = []
+        for i in range(500):
+            played_at = START + timedelta(minutes=37 * i)
+            track = cls.tracks[i % len(cls.tracks)]
+            rows.append((
+                cls.user.id, track.id, played_at, 60_000 + i,
+                listening_dedup_key(played_at, track.spotify_id, 60_000 + i),
+            ))
+        bulk_load(ListeningHistory, ("user_id", "track_id", "played_at", "ms_played", "dedup_key"), rows)
+        refresh_rollups(cls.user.id, {played_at.date() for _, _, played_at, _, _ in rows})
+
+        with connection.cursor() as cursor:
+            for table in TABLES:
+                cursor.execute(f"ANALYZE {table}")
+
+    def explain(self, sql, params=(), bitmapscan=True):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            if not bitmapscan:
+                cursor.execute("SET LOCAL enable_bitmapscan = off")
+            cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return list(plan_nodes(plan[0]["Plan"]))
+
+    def explain_queryset(self, queryset, **options):
+        sql, params = queryset.query.sql_with_params()
+        return self.explain(sql, params, **options)
+
+    def parent_index(self, index_name):
+        """The index on ListeningHistory a partition's index was created from."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT inhparent::regclass::text FROM pg_inherits WHERE inhrelid = %s::regclass",
+                [index_name],
+            )
+            row = cursor.fetchone()
+        return row[0] if row else index_name
+
+    def scanned_indexes(self, nodes, node_type):
+        return {self.parent_index(node["Index Name"]) for node in nodes if node["Node Type"] == node_type}
+
+    def test_analytics_endpoints_never_seq_scan(self):
+        factory = APIRequestFactory()
+        queries = [
+            {},
+            {"from": "2025-03-02", "to": "2025-03-05"},
+            {"from": "2025-03-02", "to": "2025-03-05", "granularity": "day", "exact": "1"},
+        ]
+        for pattern in urlpatterns:
+            for params in queries:
+                with self.subTest(endpoint=pattern.name, **params):
+                    request = factory.get("/", params)
+                    force_authenticate(request, user=self.user)
+                    with CaptureQueriesContext(connection) as captured:
+                        pattern.callback(request).render()
+
+                    for query in captured.captured_queries:
+                        if not any(table in query["sql"] for table in TABLES):
+                            continue
+                        nodes = [node for node in self.explain(query["sql"]) if "Relation Name" in node]
+                        scans = {node["Node Type"] for node in nodes if node["Relation Name"].startswith(TABLES)}
+                        self.assertLessEqual(scans, INDEX_SCANS, query["sql"])
+
+    def test_user_window_totals_are_index_only(self):
+        listens = ListeningHistory.objects.filter(
+            user=self.user,
+            played_at__gte=START + timedelta(days=1),
+            played_at__lt=START + timedelta(days=3),
+        )
+        nodes = self.explain_queryset(listens.values("user_id").annotate(ms_played=Sum("ms_played")), bitmapscan=False)
+        self.assertEqual(self.scanned_indexes(nodes, "Index Only Scan"), {"history_user_played_idx"})
+
+    def test_track_stats_are_index_only(self):
+        stats = (
+            ListeningHistory.objects
+            .filter(user=self.user, track_id__in=[track.id for track in self.tracks[:2]])
+            .values("track_id")
+            .annotate(ms_played=Sum("ms_played"), first=Min("played_at"), last=Max("played_at"))
+        )
+        nodes = self.explain_queryset(stats, bitmapscan=False)
+        self.assertEqual(self.scanned_indexes(nodes, "Index Only Scan"), {"history_user_track_idx"})
+
+    def test_cross_user_time_ranges_use_brin(self):
+        listens = ListeningHistory.objects.filter(
+            played_at__gte=START + timedelta(days=1),
+            played_at__lt=START + timedelta(days=2),
+        )
+        nodes = self.explain_queryset(listens.values("id"))
+        self.assertIn("history_played_at_brin", self.scanned_indexes(nodes, "Bitmap Index Scan"))
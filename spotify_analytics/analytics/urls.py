@@ -1,10 +1,12 @@
 from django.urls import path
 
 from spotify_analytics.analytics.views import PlatformStatsView, SkippedStatsView, ShuffleStatsView, ArtistShareView, \
-    AnalyticsOverviewView, ListeningActivityByHourView, GeoStatsView
+    AnalyticsOverviewView, ListeningActivityByHourView, GeoStatsView, AnalyticsSummaryView, \
+    AnalyticsCacheStatsView
 
 app_name = "analytics"
 urlpatterns = [
+    path("summary/", AnalyticsSummaryView.as_view(), name="summary"),
     path("overview/", AnalyticsOverviewView.as_view(), name="overview"),
     path("platforms/", PlatformStatsView.as_view(), name="platforms"),
     path("skipped/", SkippedStatsView.as_view(), name="skipped"),
@@ -12,4 +14,5 @@ urlpatterns = [
     path("artist-share/", ArtistShareView.as_view(), name="artist_share"),
     path("activity-by-hour/", ListeningActivityByHourView.as_view(), name="listening_activity_by_hour"),
     path("geo/", GeoStatsView.as_view(), name="geo"),
+    path("cache-stats/", AnalyticsCacheStatsView.as_view(), name="cache_stats"),
 ]
\ No newline at end of file
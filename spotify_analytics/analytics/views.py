@@ -1,169 +1,205 @@
-from django.contrib.gis.geoip2 import GeoIP2
-from django.db.models import Count, Sum
-from django.db.models.functions import ExtractHour
-from rest_framework import views, permissions, response
-
-from spotify_analytics.core.models import ListeningHistory
+import zoneinfo
+from datetime import datetime, time, timedelta
 
+from django.db.models import Count, DateField, F, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework import exceptions, views, permissions, response, status
 
-class PlatformStatsView(views.APIView):
+from spotify_analytics.analytics.cache import cached_response, response_cache
+from spotify_analytics.analytics.summary import GRANULARITIES, SECTIONS, artist_share, listening_summary
+from spotify_analytics.core.models import ListeningHistory
+from spotify_analytics.core.params import minutes_param
+
+ARTIST_SHARE_LIMIT = 5
+MAX_ARTIST_SHARE_LIMIT = 50
+
+
+def period_params(query_params):
+    """
+    ``{"start": ..., "stop": ...}`` aware datetimes from the ``from`` / ``to``
+    query dates (both optional, ``to`` inclusive). Raises ValueError on a
+    malformed date.
+    """
+    period = {}
+    for param, key, offset in (("from", "start", 0), ("to", "stop", 1)):
+        value = query_params.get(param)
+        if value is None:
+            continue
+        try:
+            day = parse_date(value)
+        except ValueError:
+            day = None
+        if day is None:
+            raise ValueError(f"{param} must be a YYYY-MM-DD date")
+        period[key] = timezone.make_aware(datetime.combine(day + timedelta(days=offset), time.min))
+    return period
+
+
+def window_params(query_params):
+    """
+    ``period_params()`` plus the ``granularity`` to split the window into.
+    Raises ValueError on malformed params.
+    """
+    window = {"start": None, "stop": None, **period_params(query_params)}
+    window["granularity"] = query_params.get("granularity")
+    if window["granularity"] not in (None, *GRANULARITIES):
+        raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+    return window
+
+
+def exact_param(query_params):
+    return query_params.get("exact") in ("1", "true")
+
+
+class InvalidParams(exceptions.APIException):
+    status_code = status.HTTP_400_BAD_REQUEST
+
+
+class AnalyticsView(views.APIView):
+    """
+    Every analytics endpoint takes ``?from=`` / ``?to=`` dates (inclusive)
+    and ``?granularity=day|week|month`` to return a series of periods
+    instead of one total, both in the user's ``?tz=`` (an IANA name,
+    TIME_ZONE by default). The window is parsed into ``self.window``.
+    """
     permission_classes = [permissions.IsAuthenticated]
 
-    def get(self, request):
-        qs = (
-            ListeningHistory.objects
-            .filter(user=request.user)
-            .values("platform")
-            .annotate(count=Count("id"))
-            .order_by("-count")
-        )
-        return response.Response(qs)
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
 
+        tz = request.query_params.get("tz")
+        try:
+            timezone.activate(zoneinfo.ZoneInfo(tz) if tz else timezone.get_default_timezone())
+        except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+            raise InvalidParams(f"Unknown timezone: {tz}")
 
-class SkippedStatsView(views.APIView):
-    permission_classes = [permissions.IsAuthenticated]
+        try:
+            self.window = window_params(request.query_params)
+        except ValueError as e:
+            raise InvalidParams(str(e))
 
-    def get(self, request):
-        qs = (
-            ListeningHistory.objects
-            .filter(user=request.user)
-            .values("skipped")
-            .annotate(count=Count("id"))
-        )
-        return response.Response(qs)
+    def handle_exception(self, exc):
+        if isinstance(exc, InvalidParams):
+            return response.Response({"error": exc.detail}, status=exc.status_code)
+        return super().handle_exception(exc)
 
+    def finalize_response(self, request, response, *args, **kwargs):
+        timezone.deactivate()
+        return super().finalize_response(request, response, *args, **kwargs)
 
-class ShuffleStatsView(views.APIView):
-    permission_classes = [permissions.IsAuthenticated]
 
+class PlatformStatsView(AnalyticsView):
+
+    @cached_response("platforms")
     def get(self, request):
-        qs = (
-            ListeningHistory.objects
-            .filter(user=request.user)
-            .values("shuffle")
-            .annotate(count=Count("id"))
-        )
-        return response.Response(qs)
+        return response.Response(listening_summary(request.user, ["platforms"], **self.window)["platforms"])
 
 
-class ArtistShareView(views.APIView):
-    permission_classes = [permissions.IsAuthenticated]
+class SkippedStatsView(AnalyticsView):
 
+    @cached_response("skipped")
     def get(self, request):
-        qs = (
-            ListeningHistory.objects
-            .filter(user=request.user)
-            .values("track__artists__name")
-            .annotate(count=Count("id"))
-            .order_by("-count")
-        )
+        return response.Response(listening_summary(request.user, ["skipped"], **self.window)["skipped"])
 
-        top = qs[:5]
-        other = sum(x["count"] for x in qs[5:])
 
-        data = list(top)
-        if other:
-            data.append({"track__artists__name": "Other", "count": other})
+class ShuffleStatsView(AnalyticsView):
 
-        return response.Response(data)
+    @cached_response("shuffle")
+    def get(self, request):
+        return response.Response(listening_summary(request.user, ["shuffle"], **self.window)["shuffle"])
 
 
-class AnalyticsOverviewView(views.APIView):
-    permission_classes = [permissions.IsAuthenticated]
+class ArtistShareView(AnalyticsView):
+    """Top ``?limit=`` artists (default 5) plus "Other", per period with a granularity."""
 
+    @cached_response("artist_share")
     def get(self, request):
-        user = request.user
-        queryset = ListeningHistory.objects.filter(user=user)
+        try:
+            limit = int(request.query_params.get("limit", ARTIST_SHARE_LIMIT))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= MAX_ARTIST_SHARE_LIMIT:
+            return response.Response(
+                {"error": f"limit must be between 1 and {MAX_ARTIST_SHARE_LIMIT}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-        base_metrics = queryset.aggregate(
-            total_streams=Count('id'),
-            total_ms=Sum('ms_played')
-        )
+        return response.Response(artist_share(request.user, limit, **self.window))
 
-        diff_tracks = queryset.values('track_id').distinct().count()
-        diff_albums = queryset.values('track__album_id').distinct().count()
-        diff_artists = queryset.values('track__artists').distinct().count()
 
-        ms_in_minute = 1000 * 60
-        minutes_in_hour = 60
+class AnalyticsOverviewView(AnalyticsView):
+    """Distinct tracks/albums/artists are estimated (within ~2%) unless ``?exact=1``."""
+
+    @cached_response("overview")
+    def get(self, request):
+        exact = exact_param(request.query_params)
+        return response.Response(listening_summary(request.user, ["overview"], exact=exact, **self.window)["overview"])
 
-        total_ms = base_metrics['total_ms'] or 0
-        total_minutes = total_ms // ms_in_minute
 
-        return response.Response({
-            "total_streams": base_metrics['total_streams'],
-            "minutes_streamed": total_minutes,
-            "hours_streamed": total_minutes // minutes_in_hour,
-            "different_tracks": diff_tracks,
-            "different_artists": diff_artists,
-            "different_albums": diff_albums,
-        })
+class ListeningActivityByHourView(AnalyticsView):
+    @cached_response("listening_activity_by_hour")
+    def get(self, request):
+        return response.Response(listening_summary(request.user, ["activity_by_hour"], **self.window)["activity_by_hour"])
 
 
-class ListeningActivityByHourView(views.APIView):
-    permission_classes = [permissions.IsAuthenticated]
+class AnalyticsSummaryView(AnalyticsView):
+    """Every section above from a single pass: ``?sections=overview,platforms`` (and ``?exact=1``)."""
 
+    @cached_response("summary")
     def get(self, request):
-        stats = (
-            ListeningHistory.objects
-            .filter(user=request.user)
-            .annotate(hour=ExtractHour('played_at'))
-            .values('hour')
-            .annotate(
-                streams=Count('id'),
-                minutes=Sum('ms_played') / 60000
+        sections = request.query_params.get("sections")
+        sections = sections.split(",") if sections else SECTIONS
+
+        unknown = set(sections) - set(SECTIONS)
+        if unknown:
+            return response.Response(
+                {"error": f"Unknown sections: {', '.join(sorted(unknown))}"},
+                status=status.HTTP_400_BAD_REQUEST,
             )
-            .order_by('hour')
-        )
-
-        hour_map = {h: {"hour": h, "streams": 0, "minutes": 0} for h in range(24)}
-        for s in stats:
-            hour_map[s['hour']] = {
-                "hour": s['hour'],
-                "streams": s['streams'],
-                "minutes": round(s['minutes'] or 0)
-            }
 
-        return response.Response(hour_map.values())
+        exact = exact_param(request.query_params)
+        return response.Response(listening_summary(request.user, sections, exact=exact, **self.window))
 
 
-class GeoStatsView(views.APIView):
-    permission_classes = [permissions.IsAuthenticated]
-
+class GeoStatsView(AnalyticsView):
+    @cached_response("geo")
     def get(self, request):
-        user = request.user
-        queryset = ListeningHistory.objects.filter(user=user)
+        listens = ListeningHistory.objects.filter(user=request.user, location__isnull=False)
+        if self.window["start"] is not None:
+            listens = listens.filter(played_at__gte=self.window["start"])
+        if self.window["stop"] is not None:
+            listens = listens.filter(played_at__lt=self.window["stop"])
 
-        ip_stats = (
-            queryset.values('ip_addr')
+        periods = {}
+        if self.window["granularity"] is not None:
+            periods["period"] = Trunc("played_at", self.window["granularity"], output_field=DateField())
+
+        stats = (
+            listens
+            .values(
+                **periods,
+                city=F("location__city"),
+                country=F("location__country_code"),
+                latitude=F("location__latitude"),
+                longitude=F("location__longitude"),
+            )
             .annotate(
-                ms_played=Sum('ms_played'),
-                sessions=Count('id')
+                ms_played=Sum("ms_played"),
+                sessions=Count("id"),
             )
+            .order_by(*periods)
         )
+        return response.Response(list(stats))
+
 
-        g = GeoIP2()
-        city_groups = {}
-
-        for entry in ip_stats:
-            ip = entry['ip_addr']
-            try:
-                location = g.city(ip)
-                city_key = f"{location['city']}_{location['country_code']}"
-
-                if city_key not in city_groups:
-                    city_groups[city_key] = {
-                        'city': location['city'],
-                        'country': location['country_code'],
-                        'latitude': location['latitude'],
-                        'longitude': location['longitude'],
-                        'ms_played': 0,
-                        'sessions': 0
-                    }
-
-                city_groups[city_key]['ms_played'] += entry['ms_played']
-                city_groups[city_key]['sessions'] += entry['sessions']
-            except Exception:
-                continue
-
-        return response.Response(list(city_groups.values()))
+class AnalyticsCacheStatsView(views.APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        try:
+            minutes = minutes_param(request.query_params)
+        except ValueError as e:
+            return response.Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return response.Response(response_cache.stats(minutes) if response_cache.enabled else {})
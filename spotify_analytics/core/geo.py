@@ -0,0 +1,95 @@
+"""
+IP geolocation. Every address is looked up in the GeoIP database once,
+the first time an import brings it in, and remembered in IPLocation.
+"""
+import ipaddress
+import logging
+from functools import cache, lru_cache
+
+from django.conf import settings
+from django.contrib.gis.geoip2 import GeoIP2, GeoIP2Exception
+from django.db.models import Q
+from geoip2.errors import GeoIP2Error
+
+from spotify_analytics.core.models import IPLocation, Location
+
+logger = logging.getLogger(__name__)
+
+
+@cache
+def geoip():
+    """Process-wide reader over the memory-mapped database file."""
+    return GeoIP2(cache=GeoIP2.MODE_MMAP)
+
+
+def geoip_available():
+    try:
+        geoip()
+    except GeoIP2Exception as e:
+        logger.warning("GeoIP database unavailable, locations left unresolved: %s", e)
+        return False
+    return True
+
+
+@lru_cache(maxsize=settings.GEOIP_CACHE_SIZE)
+def locate(ip):
+    """``(city, country_code, latitude, longitude)`` of ``ip``, or None if unknown."""
+    try:
+        city = geoip().city(ipaddress.ip_address(ip))
+    except (GeoIP2Error, ValueError):
+        return None
+    if not city["country_code"]:
+        return None
+    return city["city"], city["country_code"], city["latitude"], city["longitude"]
+
+
+def location_ids_for(places):
+    """
+    ``{(city, country_code): Location pk}`` for ``places``, which are
+    ``locate()`` results; missing locations are created.
+    """
+    places = {(city, country_code): (city, country_code, lat, lon) for city, country_code, lat, lon in places}
+    if not places:
+        return {}
+
+    Location.objects.bulk_create(
+        [
+            Location(city=city, country_code=country_code, latitude=lat, longitude=lon)
+            for city, country_code, lat, lon in places.values()
+        ],
+        ignore_conflicts=True,
+    )
+    return {
+        (city, country_code): pk
+        for pk, city, country_code in (
+            Location.objects
+            .filter(country_code__in={country_code for _, country_code in places})
+            .filter(Q(city__in={city for city, _ in places if city}) | Q(city__isnull=True))
+            .values_list("id", "city", "country_code")
+        )
+        if (city, country_code) in places
+    }
+
+
+def resolve_locations(ips):
+    """
+    Return ``{ip: Location pk or None}`` for ``ips``, looking up and storing
+    the addresses never seen before. Without a GeoIP database new addresses
+    are left out (and stay unresolved, to be looked up on a later import).
+    """
+    ips = set(ips) - {None}
+    known = dict(IPLocation.objects.filter(ip__in=ips).values_list("ip", "location_id"))
+
+    new = ips - known.keys()
+    if new and geoip_available():
+        places = {ip: locate(ip) for ip in new}
+        location_ids = location_ids_for({place for place in places.values() if place})
+        resolved = {ip: location_ids[place[:2]] if place else None for ip, place in places.items()}
+
+        IPLocation.objects.bulk_create(
+            [IPLocation(ip=ip, location_id=location_id) for ip, location_id in resolved.items()],
+            ignore_conflicts=True,
+        )
+        known.update(resolved)
+
+    return known
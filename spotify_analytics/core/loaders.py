@@ -0,0 +1,174 @@
+import io
+import uuid
+from datetime import date
+from itertools import islice
+
+from django.db import connections, transaction
+
+COPY_BATCH_SIZE = 10_000
+
+_copy_escapes = str.maketrans({
+    "\\": "\\\\",
+    "\t": "\\t",
+    "\n": "\\n",
+    "\r": "\\r",
+})
+
+
+# Values of these types are already in a form COPY understands; anything
+# else goes through the field's own database preparation.
+_native_types = (str, int, float, bool, date, uuid.UUID, type(None))
+
+
+def _copy_value(value):
+    if value is None:
+        return "\\N"
+    if value is True:
+        return "t"
+    if value is False:
+        return "f"
+    return str(value).translate(_copy_escapes)
+
+
+def _batches(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def supports_copy(using="default"):
+    return connections[using].vendor == "postgresql"
+
+
+def bulk_load(
+    model,
+    field_names,
+    rows,
+    batch_size=COPY_BATCH_SIZE,
+    using="default",
+    use_copy=None,
+    ignore_conflicts=False,
+):
+    """
+    Insert ``rows`` (tuples ordered like ``field_names``, which are field
+    attnames such as ``"track_id"``) into ``model``'s table.
+
+    On PostgreSQL rows are streamed with ``COPY ... FROM STDIN`` without
+    instantiating models; elsewhere they fall back to ``bulk_create``.
+    Concrete fields missing from ``field_names`` get their model default.
+
+    With ``ignore_conflicts`` rows violating a unique constraint are
+    skipped: COPY goes into a temporary table that is then merged with
+    ``INSERT ... ON CONFLICT DO NOTHING``.
+
+    Returns the number of rows actually written.
+    """
+    connection = connections[using]
+    if use_copy is None:
+        use_copy = supports_copy(using)
+
+    opts = model._meta
+    given = [opts.get_field(name) for name in field_names]
+    defaulted = [
+        f for f in opts.concrete_fields
+        if f not in given and f.has_default()
+    ]
+    fields = given + defaulted
+    attnames = [f.attname for f in fields]
+    if ignore_conflicts and not use_copy:
+        key = _unique_key(opts, field_names)
+        key_positions = [field_names.index(name) for name in key]
+
+    written = 0
+    for batch in _batches(rows, batch_size):
+        values = [
+            tuple(row) + tuple(f.get_default() for f in defaulted)
+            for row in batch
+        ]
+
+        if use_copy and ignore_conflicts:
+            written += _copy_merge_batch(connection, opts.db_table, fields, values)
+        elif use_copy:
+            _copy_batch(connection, opts.db_table, fields, values)
+            written += len(values)
+        elif ignore_conflicts:
+            # Plain INSERT backends can't report skipped rows, so the batch's
+            # keys already stored are looked up before and after instead.
+            # This path is only meant for development databases.
+            keys = {tuple(row[i] for i in key_positions) for row in batch}
+            before = _stored_keys(model, using, key, keys)
+            model.objects.using(using).bulk_create(
+                [model(**dict(zip(attnames, row))) for row in values],
+                batch_size=len(values),
+                ignore_conflicts=True,
+            )
+            written += len(_stored_keys(model, using, key, keys) - before)
+        else:
+            model.objects.using(using).bulk_create(
+                [model(**dict(zip(attnames, row))) for row in values],
+                batch_size=len(values),
+            )
+            written += len(values)
+
+    return written
+
+
+def _unique_key(opts, field_names):
+    """The attnames of a unique constraint covered by ``field_names``."""
+    candidates = [
+        *(constraint.fields for constraint in opts.total_unique_constraints),
+        *opts.unique_together,
+        *([f.name] for f in opts.concrete_fields if f.unique),
+    ]
+    for candidate in candidates:
+        key = [opts.get_field(name).attname for name in candidate]
+        if set(key) <= set(field_names):
+            return key
+    raise ValueError(f"ignore_conflicts needs a unique key of {opts.label} among the loaded fields")
+
+
+def _stored_keys(model, using, key, keys):
+    stored = model.objects.using(using).filter(**{
+        f"{name}__in": {k[i] for k in keys}
+        for i, name in enumerate(key)
+    })
+    return keys & set(stored.values_list(*key))
+
+
+def _copy_merge_batch(connection, table, fields, values):
+    qn = connection.ops.quote_name
+    staging = f"{table}_load"
+    columns = ", ".join(qn(f.column) for f in fields)
+
+    with transaction.atomic(using=connection.alias):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TEMPORARY TABLE {qn(staging)} "
+                f"(LIKE {qn(table)} INCLUDING DEFAULTS) ON COMMIT DROP"
+            )
+            _copy_batch(connection, staging, fields, values)
+            cursor.execute(
+                f"INSERT INTO {qn(table)} ({columns}) "
+                f"SELECT {columns} FROM {qn(staging)} "
+                f"ON CONFLICT DO NOTHING"
+            )
+            inserted = cursor.rowcount
+            cursor.execute(f"DROP TABLE {qn(staging)}")
+
+    return inserted
+
+
+def _copy_batch(connection, table, fields, values):
+    buf = io.StringIO()
+    for row in values:
+        buf.write("\t".join(
+            _copy_value(v if isinstance(v, _native_types) else f.get_db_prep_save(v, connection))
+            for f, v in zip(fields, row)
+        ))
+        buf.write("\n")
+    buf.seek(0)
+
+    qn = connection.ops.quote_name
+    columns = ", ".join(qn(f.column) for f in fields)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(f"COPY {qn(table)} ({columns}) FROM STDIN", buf)
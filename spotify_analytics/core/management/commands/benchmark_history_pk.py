@@ -0,0 +1,97 @@
+import io
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from spotify_analytics.core.models import uuid7
+
+KEY_SCHEMES = {
+    "uuid4": ("uuid PRIMARY KEY", lambda: uuid.uuid4()),
+    "uuid7": ("uuid PRIMARY KEY", lambda: uuid7()),
+    "bigint": ("bigint GENERATED ALWAYS AS IDENTITY PRIMARY KEY", None),
+}
+
+
+def pretty(size):
+    return f"{size / 1024 / 1024:,.0f} MB"
+
+
+class Command(BaseCommand):
+    help = (
+        "Insert the same synthetic listens into tables keyed by uuid4, uuid7 and a "
+        "bigint identity and compare insert throughput and primary key index size "
+        "(PostgreSQL only)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10_000_000)
+        parser.add_argument("--batch-size", type=int, default=100_000)
+        parser.add_argument("--schemes", nargs="+", choices=KEY_SCHEMES, default=list(KEY_SCHEMES))
+        parser.add_argument("--keep", action="store_true", help="Keep the benchmark tables.")
+
+    def handle(self, *args, rows, batch_size, schemes, keep, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("benchmark_history_pk requires a PostgreSQL database.")
+
+        track_ids = [uuid.uuid4() for _ in range(50_000)]
+        for scheme in schemes:
+            table = f"benchmark_history_pk_{scheme}"
+            column, make_id = KEY_SCHEMES[scheme]
+
+            with connection.cursor() as cursor:
+                cursor.execute(f"DROP TABLE IF EXISTS {table}")
+                cursor.execute(
+                    f"CREATE TABLE {table} ("
+                    f"id {column}, user_id integer NOT NULL, "
+                    f"track_id uuid NOT NULL, played_at timestamptz NOT NULL)"
+                )
+
+            random.seed(0)
+            timings = []
+            for start in range(0, rows, batch_size):
+                size = min(batch_size, rows - start)
+                batch_started_at = time.monotonic()
+                self.copy_batch(table, make_id, track_ids, start, size)
+                timings.append((size, time.monotonic() - batch_started_at))
+            elapsed = sum(seconds for _, seconds in timings)
+            # Throughput once the table is big is what the key scheme decides.
+            tail = timings[-max(1, len(timings) // 10):]
+            tail_rate = sum(size for size, _ in tail) / sum(seconds for _, seconds in tail)
+
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT pg_relation_size(%s), pg_relation_size(%s)",
+                    [table, f"{table}_pkey"],
+                )
+                heap_size, pkey_size = cursor.fetchone()
+                if not keep:
+                    cursor.execute(f"DROP TABLE {table}")
+
+            self.stdout.write(
+                f"{scheme:>7}: {rows:,} rows in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s, "
+                f"last 10% at {tail_rate:,.0f} rows/s)  "
+                f"heap {pretty(heap_size)}  pkey {pretty(pkey_size)}"
+            )
+
+    def copy_batch(self, table, make_id, track_ids, start, size):
+        played_from = datetime(2015, 1, 1, tzinfo=timezone.utc)
+        buf = io.StringIO()
+        for i in range(start, start + size):
+            values = [
+                str(random.randrange(1000)),
+                str(random.choice(track_ids)),
+                (played_from + timedelta(minutes=3 * i)).isoformat(),
+            ]
+            if make_id:
+                values.insert(0, str(make_id()))
+            buf.write("\t".join(values))
+            buf.write("\n")
+        buf.seek(0)
+
+        columns = "id, user_id, track_id, played_at" if make_id else "user_id, track_id, played_at"
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.copy_expert(f"COPY {table} ({columns}) FROM STDIN", buf)
@@ -0,0 +1,27 @@
+import uuid
+
+from django.core.management.base import BaseCommand
+
+from spotify_analytics.analytics.cache import response_cache
+from spotify_analytics.analytics.models import DailySketch, HourlyRollup, TrackRollup, UserSketch
+from spotify_analytics.core.partitions import purge_user_history
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete a user's listening history partition by partition in small batches. "
+        "Run it before deleting a user with a large history."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("user_id", type=uuid.UUID)
+        parser.add_argument("--batch-size", type=int, default=10_000)
+
+    def handle(self, *args, user_id, batch_size, **options):
+        deleted = purge_user_history(user_id, batch_size=batch_size)
+        HourlyRollup.objects.filter(user_id=user_id).delete()
+        TrackRollup.objects.filter(user_id=user_id).delete()
+        DailySketch.objects.filter(user_id=user_id).delete()
+        UserSketch.objects.filter(user_id=user_id).delete()
+        response_cache.bump(user_id)
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} listens of user {user_id}."))
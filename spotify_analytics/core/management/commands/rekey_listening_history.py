@@ -0,0 +1,65 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from psycopg2.extras import execute_values
+
+from spotify_analytics.core.models import ListeningHistory, uuid7
+
+
+class Command(BaseCommand):
+    help = (
+        "Replace random uuid4 keys of existing ListeningHistory rows with uuid7 "
+        "keys derived from created_at, in short batches that can run while the "
+        "site is up (PostgreSQL only)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--sleep", type=float, default=0.0, help="Pause between batches, in seconds.")
+
+    def handle(self, *args, batch_size, sleep, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("rekey_listening_history requires a PostgreSQL database.")
+
+        table = connection.ops.quote_name(ListeningHistory._meta.db_table)
+        last_id = None
+        scanned = rekeyed = 0
+
+        while True:
+            # Walk the primary key in order. Rows that are already uuid7,
+            # including ones this run rewrote, are skipped.
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(
+                    f"SELECT id, created_at FROM {table} "
+                    f"WHERE %s::uuid IS NULL OR id > %s::uuid "
+                    f"ORDER BY id LIMIT %s",
+                    [last_id, last_id, batch_size],
+                )
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+
+                last_id = rows[-1][0]
+                scanned += len(rows)
+                pairs = [(old_id, uuid7(created_at)) for old_id, created_at in rows if old_id.version != 7]
+                if pairs:
+                    execute_values(
+                        cursor,
+                        f"UPDATE {table} AS t SET id = v.new_id "
+                        f"FROM (VALUES %s) AS v (old_id, new_id) "
+                        f"WHERE t.id = v.old_id",
+                        pairs,
+                        template="(%s::uuid, %s::uuid)",
+                        page_size=batch_size,
+                    )
+                    rekeyed += len(pairs)
+
+            self.stdout.write(f"scanned {scanned}, rekeyed {rekeyed}")
+            if sleep:
+                time.sleep(sleep)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {rekeyed} rows rekeyed. Run VACUUM and REINDEX on "
+            f"{ListeningHistory._meta.db_table} to reclaim the old key space."
+        ))
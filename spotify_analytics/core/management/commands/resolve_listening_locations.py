@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import OuterRef, Subquery
+
+from spotify_analytics.analytics.cache import response_cache
+from spotify_analytics.core.geo import geoip_available, resolve_locations
+from spotify_analytics.core.models import IPLocation, ListeningHistory
+
+
+class Command(BaseCommand):
+    help = (
+        "Resolve the location of listens imported before locations were tracked "
+        "or while no GeoIP database was installed."
+    )
+
+    def handle(self, *args, **options):
+        if not geoip_available():
+            raise CommandError("The GeoIP database is not available.")
+
+        unresolved = ListeningHistory.objects.filter(location__isnull=True, ip_addr__isnull=False)
+        user_ids = list(unresolved.values_list("user_id", flat=True).distinct().order_by())
+
+        for user_id in user_ids:
+            listens = unresolved.filter(user_id=user_id)
+            resolve_locations(listens.values_list("ip_addr", flat=True).distinct().order_by())
+            updated = listens.update(
+                location_id=Subquery(
+                    IPLocation.objects.filter(ip=OuterRef("ip_addr")).values("location_id")[:1]
+                )
+            )
+            response_cache.bump(user_id)
+            self.stdout.write(f"User {user_id}: {updated} listens checked.")
@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from spotify_analytics.core.models import ListeningHistory
+
+
+def pretty(size):
+    for unit in ("B", "kB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+class Command(BaseCommand):
+    help = "Print heap, TOAST and per-index sizes of tables (PostgreSQL only)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("tables", nargs="*", default=[ListeningHistory._meta.db_table])
+
+    def handle(self, *args, tables, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("table_sizes requires a PostgreSQL database.")
+
+        with connection.cursor() as cursor:
+            for table in tables:
+                # Partitioned tables are summed over their partitions.
+                cursor.execute(
+                    "SELECT relid::text FROM pg_partition_tree(%s::regclass) WHERE isleaf",
+                    [table],
+                )
+                relations = [relid for relid, in cursor.fetchall()] or [table]
+                cursor.execute(
+                    """
+                    SELECT
+                        sum(pg_table_size(oid)),
+                        sum(pg_relation_size(oid)),
+                        sum(pg_indexes_size(oid)),
+                        sum(pg_total_relation_size(oid)),
+                        sum(GREATEST(reltuples, 0))::bigint
+                    FROM pg_class
+                    WHERE oid = ANY(%s::regclass[])
+                    """,
+                    [relations],
+                )
+                table_size, heap_size, indexes_size, total_size, rows = cursor.fetchone()
+
+                self.stdout.write(f"{table} (~{rows} rows)")
+                self.stdout.write(f"  heap     {pretty(heap_size):>10}")
+                self.stdout.write(f"  table    {pretty(table_size):>10}")
+                self.stdout.write(f"  indexes  {pretty(indexes_size):>10}")
+                self.stdout.write(f"  total    {pretty(total_size):>10}")
+
+                cursor.execute(
+                    """
+                    SELECT
+                        i.indexrelid::regclass::text,
+                        COALESCE(
+                            (SELECT sum(pg_relation_size(relid)) FROM pg_partition_tree(i.indexrelid) WHERE isleaf),
+                            pg_relation_size(i.indexrelid)
+                        )
+                    FROM pg_index i
+                    WHERE i.indrelid = %s::regclass
+                    ORDER BY 2 DESC
+                    """,
+                    [table],
+                )
+                for name, size in cursor.fetchall():
+                    self.stdout.write(f"    {name:<50} {pretty(size):>10}")
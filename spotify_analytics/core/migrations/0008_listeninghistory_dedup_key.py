@@ -0,0 +1,95 @@
+import hashlib
+
+from django.db import migrations, models, transaction
+
+BATCH_SIZE = 5000
+
+
+def listening_dedup_key(played_at, spotify_track_id, ms_played):
+    # Frozen copy of core.models.listening_dedup_key as of this migration,
+    # so later changes there can't change the keys it backfills.
+    played_at_ms = round(played_at.timestamp() * 1000)
+    digest = hashlib.blake2b(
+        f"{played_at_ms}:{spotify_track_id}:{ms_played}".encode(),
+        digest_size=8,
+    ).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def backfill_dedup_keys(apps, schema_editor):
+    ListeningHistory = apps.get_model("core", "ListeningHistory")
+    db_alias = schema_editor.connection.alias
+    queryset = (
+        ListeningHistory.objects.using(db_alias)
+        .filter(dedup_key__isnull=True)
+        .order_by("id")
+    )
+
+    last_id = None
+    while True:
+        batch = queryset
+        if last_id is not None:
+            batch = batch.filter(id__gt=last_id)
+        rows = list(batch.values_list("id", "played_at", "spotify_track_id", "ms_played")[:BATCH_SIZE])
+        if not rows:
+            break
+
+        with transaction.atomic(using=db_alias):
+            ListeningHistory.objects.using(db_alias).bulk_update(
+                [
+                    ListeningHistory(
+                        id=pk,
+                        dedup_key=listening_dedup_key(played_at, spotify_track_id, ms_played),
+                    )
+                    for pk, played_at, spotify_track_id, ms_played in rows
+                ],
+                ["dedup_key"],
+            )
+        last_id = rows[-1][0]
+
+
+def delete_duplicates(apps, schema_editor):
+    schema_editor.execute(
+        """
+        DELETE FROM core_listeninghistory
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT
+                    id,
+                    ROW_NUMBER() OVER (
+                        PARTITION BY user_id, dedup_key
+                        ORDER BY created_at, id
+                    ) AS position
+                FROM core_listeninghistory
+            ) ranked
+            WHERE position > 1
+        )
+        """
+    )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('core', '0007_alter_listeninghistory_ip_addr'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listeninghistory',
+            name='dedup_key',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.RunPython(backfill_dedup_keys, migrations.RunPython.noop),
+        migrations.RunPython(delete_duplicates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='listeninghistory',
+            name='dedup_key',
+            field=models.BigIntegerField(),
+        ),
+        migrations.AddConstraint(
+            model_name='listeninghistory',
+            constraint=models.UniqueConstraint(fields=('user', 'dedup_key'), name='unique_listeninghistory_user_dedup_key'),
+        ),
+    ]
@@ -0,0 +1,152 @@
+import django.db.models.deletion
+from django.db import migrations, models, transaction
+from django.db.models import OuterRef, Subquery
+
+BATCH_SIZE = 10000
+
+
+def fill_lookup_tables(apps, schema_editor):
+    ListeningHistory = apps.get_model("core", "ListeningHistory")
+    Platform = apps.get_model("core", "Platform")
+    PlaybackReason = apps.get_model("core", "PlaybackReason")
+    db_alias = schema_editor.connection.alias
+    history = ListeningHistory.objects.using(db_alias)
+
+    platforms = set(history.values_list("platform", flat=True).distinct())
+    reasons = (
+        set(history.values_list("reason_start", flat=True).distinct())
+        | set(history.values_list("reason_end", flat=True).distinct())
+    )
+
+    Platform.objects.using(db_alias).bulk_create(
+        [Platform(name=name) for name in platforms], ignore_conflicts=True
+    )
+    PlaybackReason.objects.using(db_alias).bulk_create(
+        [PlaybackReason(name=name) for name in reasons], ignore_conflicts=True
+    )
+
+
+def encode_history(apps, schema_editor):
+    ListeningHistory = apps.get_model("core", "ListeningHistory")
+    Platform = apps.get_model("core", "Platform")
+    PlaybackReason = apps.get_model("core", "PlaybackReason")
+    db_alias = schema_editor.connection.alias
+    history = ListeningHistory.objects.using(db_alias)
+
+    def code(model, column):
+        return Subquery(
+            model.objects.using(db_alias)
+            .filter(name=OuterRef(column))
+            .values("id")[:1]
+        )
+
+    last_id = None
+    while True:
+        batch = history.order_by("id")
+        if last_id is not None:
+            batch = batch.filter(id__gt=last_id)
+        ids = list(batch.values_list("id", flat=True)[:BATCH_SIZE])
+        if not ids:
+            break
+
+        with transaction.atomic(using=db_alias):
+            history.filter(id__in=ids).update(
+                platform_code=code(Platform, "platform"),
+                reason_start_code=code(PlaybackReason, "reason_start"),
+                reason_end_code=code(PlaybackReason, "reason_end"),
+            )
+        last_id = ids[-1]
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('core', '0008_listeninghistory_dedup_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Platform',
+            fields=[
+                ('id', models.SmallAutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=255, unique=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='PlaybackReason',
+            fields=[
+                ('id', models.SmallAutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=255, unique=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='listeninghistory',
+            name='platform_code',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='core.platform'),
+        ),
+        migrations.AddField(
+            model_name='listeninghistory',
+            name='reason_start_code',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='core.playbackreason'),
+        ),
+        migrations.AddField(
+            model_name='listeninghistory',
+            name='reason_end_code',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='core.playbackreason'),
+        ),
+        migrations.RunPython(fill_lookup_tables, migrations.RunPython.noop),
+        migrations.RunPython(encode_history, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='listeninghistory',
+            name='platform',
+        ),
+        migrations.RemoveField(
+            model_name='listeninghistory',
+            name='reason_start',
+        ),
+        migrations.RemoveField(
+            model_name='listeninghistory',
+            name='reason_end',
+        ),
+        migrations.RemoveField(
+            model_name='listeninghistory',
+            name='spotify_track_id',
+        ),
+        migrations.RenameField(
+            model_name='listeninghistory',
+            old_name='platform_code',
+            new_name='platform',
+        ),
+        migrations.RenameField(
+            model_name='listeninghistory',
+            old_name='reason_start_code',
+            new_name='reason_start',
+        ),
+        migrations.RenameField(
+            model_name='listeninghistory',
+            old_name='reason_end_code',
+            new_name='reason_end',
+        ),
+        migrations.AlterField(
+            model_name='listeninghistory',
+            name='platform',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='core.platform'),
+        ),
+        migrations.AlterField(
+            model_name='listeninghistory',
+            name='reason_start',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='core.playbackreason'),
+        ),
+        migrations.AlterField(
+            model_name='listeninghistory',
+            name='reason_end',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='core.playbackreason'),
+        ),
+    ]
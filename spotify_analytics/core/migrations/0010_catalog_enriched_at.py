@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_dictionary_encode_listeninghistory'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='album',
+            name='enriched_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='artist',
+            name='enriched_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
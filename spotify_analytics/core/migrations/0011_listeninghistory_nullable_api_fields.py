@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_catalog_enriched_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='listeninghistory',
+            name='ip_addr',
+            field=models.GenericIPAddressField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='listeninghistory',
+            name='platform',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='core.platform'),
+        ),
+        migrations.AlterField(
+            model_name='listeninghistory',
+            name='reason_end',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='core.playbackreason'),
+        ),
+        migrations.AlterField(
+            model_name='listeninghistory',
+            name='reason_start',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='core.playbackreason'),
+        ),
+        migrations.AlterField(
+            model_name='listeninghistory',
+            name='shuffle',
+            field=models.BooleanField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='listeninghistory',
+            name='skipped',
+            field=models.BooleanField(null=True),
+        ),
+    ]
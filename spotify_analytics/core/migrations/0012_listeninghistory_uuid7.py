@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:43
+
+import spotify_analytics.core.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_listeninghistory_nullable_api_fields'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='listeninghistory',
+            name='id',
+            field=models.UUIDField(default=spotify_analytics.core.models.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+    ]
@@ -0,0 +1,102 @@
+from django.db import migrations, models
+from django.utils import timezone
+
+# Frozen here rather than imported from core/partitions.py, so later changes
+# there can't change what this migration does.
+TABLE = "core_listeninghistory"
+UNPARTITIONED = f"{TABLE}_unpartitioned"
+FIRST_YEAR = 2008
+
+
+def create_partition_sql(year):
+    return (
+        f"CREATE TABLE IF NOT EXISTS {TABLE}_y{year} PARTITION OF {TABLE} "
+        f"FOR VALUES FROM ('{year}-01-01 00:00:00+00') TO ('{year + 1}-01-01 00:00:00+00')"
+    )
+
+OLD_CONSTRAINT = models.UniqueConstraint(
+    fields=["user", "dedup_key"],
+    name="unique_listeninghistory_user_dedup_key",
+)
+# Unique constraints on a partitioned table must include the partition
+# key. dedup_key already hashes played_at, so this dedups the same listens.
+NEW_CONSTRAINT = models.UniqueConstraint(
+    fields=["user", "played_at", "dedup_key"],
+    name="unique_listeninghistory_user_dedup_key",
+)
+
+
+def partition_history(apps, schema_editor):
+    ListeningHistory = apps.get_model("core", "ListeningHistory")
+    connection = schema_editor.connection
+
+    if connection.vendor != "postgresql":
+        schema_editor.remove_constraint(ListeningHistory, OLD_CONSTRAINT)
+        schema_editor.add_constraint(ListeningHistory, NEW_CONSTRAINT)
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexname <> ALL(%s)",
+            [TABLE, [f"{TABLE}_pkey", OLD_CONSTRAINT.name]],
+        )
+        index_defs = [index_def for index_def, in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f'",
+            [TABLE],
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(
+            f"SELECT EXTRACT(YEAR FROM min(played_at))::int, EXTRACT(YEAR FROM max(played_at))::int FROM {TABLE}"
+        )
+        first_year, last_year = cursor.fetchone()
+
+        cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {UNPARTITIONED}")
+        cursor.execute(
+            f"CREATE TABLE {TABLE} "
+            f"(LIKE {UNPARTITIONED} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING STORAGE) "
+            f"PARTITION BY RANGE (played_at)"
+        )
+        for year in range(min(first_year or FIRST_YEAR, FIRST_YEAR), max(last_year or 0, timezone.now().year) + 2):
+            cursor.execute(create_partition_sql(year))
+
+        cursor.execute(f"INSERT INTO {TABLE} SELECT * FROM {UNPARTITIONED}")
+        cursor.execute(f"DROP TABLE {UNPARTITIONED}")
+
+        # The primary key must include the partition key too; id stays the
+        # key Django uses.
+        cursor.execute(f"ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (id, played_at)")
+        cursor.execute(
+            f"ALTER TABLE {TABLE} ADD CONSTRAINT {NEW_CONSTRAINT.name} "
+            f"UNIQUE (user_id, played_at, dedup_key)"
+        )
+        for index_def in index_defs:
+            cursor.execute(index_def)
+        for name, definition in foreign_keys:
+            cursor.execute(f"ALTER TABLE {TABLE} ADD CONSTRAINT {name} {definition}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_listeninghistory_uuid7'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.RemoveConstraint(
+                    model_name='listeninghistory',
+                    name=OLD_CONSTRAINT.name,
+                ),
+                migrations.AddConstraint(
+                    model_name='listeninghistory',
+                    constraint=NEW_CONSTRAINT,
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(partition_history),
+            ],
+        ),
+    ]
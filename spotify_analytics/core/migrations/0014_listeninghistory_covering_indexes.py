@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:02
+
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_partition_listeninghistory'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='listeninghistory',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='listeninghistory',
+            index=models.Index(fields=['user', 'played_at'], include=('ms_played',), name='history_user_played_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listeninghistory',
+            index=models.Index(fields=['user', 'track'], include=('ms_played', 'played_at'), name='history_user_track_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listeninghistory',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['played_at'], name='history_played_at_brin'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_listeninghistory_covering_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Location',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('city', models.CharField(max_length=255, null=True)),
+                ('country_code', models.CharField(max_length=2, null=True)),
+                ('latitude', models.FloatField(null=True)),
+                ('longitude', models.FloatField(null=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('city', 'country_code'), name='unique_location_city_country_code', nulls_distinct=False)],
+            },
+        ),
+        migrations.CreateModel(
+            name='IPLocation',
+            fields=[
+                ('ip', models.GenericIPAddressField(primary_key=True, serialize=False)),
+                ('location', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.location')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='listeninghistory',
+            name='location',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='core.location'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:33
+
+from django.db import migrations, models
+
+RECENTLY_PLAYED = 2
+
+
+def mark_synced_listens(apps, schema_editor):
+    # Only listens synced from the recently-played API lack a platform and
+    # playback reasons.
+    ListeningHistory = apps.get_model("core", "ListeningHistory")
+    ListeningHistory.objects.filter(platform__isnull=True, reason_start__isnull=True).update(source=RECENTLY_PLAYED)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_listeninghistory_location'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listeninghistory',
+            name='source',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'Streaming history export'), (2, 'Recently played API')], default=1),
+        ),
+        migrations.RunPython(mark_synced_listens, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,10 @@
+import hashlib
+import os
+import time
 import uuid
 
 from django.conf import settings
+from django.contrib.postgres.indexes import BrinIndex
 from django.db import models
 from django.utils import timezone
 
@@ -20,6 +24,64 @@ class TimestampedModel(models.Model):
         abstract = True
 
 
+class LookupModel(models.Model):
+    id = models.SmallAutoField(primary_key=True)
+    name = models.CharField(max_length=255, unique=True)
+
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def ids_for(cls, names):
+        names = set(names)
+        cls.objects.bulk_create(
+            [cls(name=name) for name in names],
+            ignore_conflicts=True
+        )
+        return dict(
+            cls.objects
+            .filter(name__in=names)
+            .values_list("name", "id")
+        )
+
+
+class Platform(LookupModel):
+    pass
+
+
+class PlaybackReason(LookupModel):
+    pass
+
+
+class Location(models.Model):
+    city = models.CharField(max_length=255, null=True)
+    country_code = models.CharField(max_length=2, null=True)
+    latitude = models.FloatField(null=True)
+    longitude = models.FloatField(null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["city", "country_code"],
+                name="unique_location_city_country_code",
+                nulls_distinct=False,
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.city}, {self.country_code}"
+
+
+class IPLocation(models.Model):
+    """Where GeoIP places an address; resolved once, the first time it's imported."""
+    ip = models.GenericIPAddressField(primary_key=True)
+    # Null when the GeoIP database doesn't know the address.
+    location = models.ForeignKey(Location, on_delete=models.CASCADE, null=True, related_name="+")
+
+
 class Artist(UUIDModel, TimestampedModel):
     name = models.CharField(max_length=255)
     image = models.URLField(blank=True, null=True)
@@ -27,6 +89,7 @@ class Artist(UUIDModel, TimestampedModel):
     followers = models.IntegerField(null=True, blank=True)
     spotify_id = models.CharField(max_length=22, unique=True)
     spotify_url = models.CharField(max_length=255)
+    enriched_at = models.DateTimeField(null=True, blank=True, db_index=True)
 
     def __str__(self):
         return self.name
@@ -40,6 +103,7 @@ class Album(UUIDModel, TimestampedModel):
     popularity = models.SmallIntegerField(null=True, blank=True)
     spotify_id = models.CharField(max_length=22, unique=True)
     spotify_url = models.CharField(max_length=255)
+    enriched_at = models.DateTimeField(null=True, blank=True, db_index=True)
 
     artists = models.ManyToManyField(Artist, related_name="albums")
 
@@ -70,17 +134,112 @@ class Track(UUIDModel, TimestampedModel):
         return self.name
 
 
+def listening_dedup_key(played_at, spotify_track_id, ms_played):
+    """
+    Signed 64-bit fingerprint of a single listen, unique per user.
+    """
+    played_at_ms = round(played_at.timestamp() * 1000)
+    digest = hashlib.blake2b(
+        f"{played_at_ms}:{spotify_track_id}:{ms_played}".encode(),
+        digest_size=8,
+    ).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def uuid7(at=None):
+    """
+    RFC 9562 version 7 UUID: a 48-bit Unix ms timestamp (now, or the
+    datetime ``at``) followed by random bits, so keys sort by creation time.
+    """
+    ms = round(at.timestamp() * 1000) if at else time.time_ns() // 1_000_000
+    rand = int.from_bytes(os.urandom(10), "big")
+    value = (
+        (ms & 0xFFFF_FFFF_FFFF) << 80
+        | 0x7 << 76
+        | (rand >> 62 & 0xFFF) << 64
+        | 0b10 << 62
+        | rand & 0x3FFF_FFFF_FFFF_FFFF
+    )
+    return uuid.UUID(int=value)
+
+
+# On PostgreSQL the table is range-partitioned by year of played_at; see
+# core/partitions.py.
 class ListeningHistory(UUIDModel, TimestampedModel):
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    class Source(models.IntegerChoices):
+        EXPORT = 1, "Streaming history export"
+        RECENTLY_PLAYED = 2, "Recently played API"
+
+    # Time-ordered keys append to the right edge of the primary key index
+    # instead of landing on random pages like uuid4.
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
+    # Every per-user lookup is served by the composite indexes below.
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, db_index=False)
     track = models.ForeignKey(Track, on_delete=models.CASCADE)
-    ip_addr = models.GenericIPAddressField()
+    # Listens synced from the recently-played API carry no ip, platform,
+    # playback reasons, shuffle or skip flags.
+    ip_addr = models.GenericIPAddressField(null=True)
+    location = models.ForeignKey(
+        Location,
+        on_delete=models.PROTECT,
+        null=True,
+        db_index=False,
+        related_name="+"
+    )
     played_at = models.DateTimeField()
-    platform = models.CharField(max_length=20)
+    platform = models.ForeignKey(
+        Platform,
+        on_delete=models.PROTECT,
+        null=True,
+        db_index=False,
+        related_name="+"
+    )
     ms_played = models.PositiveIntegerField()
-    spotify_track_id = models.CharField(max_length=22)
-    reason_start = models.CharField(max_length=20)
-    reason_end = models.CharField(max_length=20)
-    shuffle = models.BooleanField()
-    skipped = models.BooleanField()
+    reason_start = models.ForeignKey(
+        PlaybackReason,
+        on_delete=models.PROTECT,
+        null=True,
+        db_index=False,
+        related_name="+"
+    )
+    reason_end = models.ForeignKey(
+        PlaybackReason,
+        on_delete=models.PROTECT,
+        null=True,
+        db_index=False,
+        related_name="+"
+    )
+    shuffle = models.BooleanField(null=True)
+    skipped = models.BooleanField(null=True)
     offline = models.BooleanField(null=True)
     offline_timestamp = models.PositiveBigIntegerField(null=True)
+    dedup_key = models.BigIntegerField()
+    # Export rows replace recently-played rows of the same plays; see
+    # spotify/sync.py.
+    source = models.PositiveSmallIntegerField(choices=Source.choices, default=Source.EXPORT)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "played_at", "dedup_key"],
+                name="unique_listeninghistory_user_dedup_key"
+            ),
+        ]
+        indexes = [
+            # Totals, per-hour activity and date ranges of a user read
+            # ms_played straight from the index (index-only scans).
+            models.Index(
+                fields=["user", "played_at"],
+                include=["ms_played"],
+                name="history_user_played_idx",
+            ),
+            # Per-track play counts, minutes and first/last listen.
+            models.Index(
+                fields=["user", "track"],
+                include=["ms_played", "played_at"],
+                name="history_user_track_idx",
+            ),
+            # Listens are appended roughly in played_at order, so a few
+            # pages of block ranges cover time scans across all users.
+            BrinIndex(fields=["played_at"], name="history_played_at_brin"),
+        ]
@@ -0,0 +1,13 @@
+MAX_STATS_MINUTES = 24 * 60
+
+
+def minutes_param(query_params, default=60):
+    """
+    The ``?minutes=`` window of the per-minute stats endpoints, clamped to
+    1..MAX_STATS_MINUTES. Raises ValueError when it isn't an integer.
+    """
+    try:
+        minutes = int(query_params.get("minutes", default))
+    except ValueError:
+        raise ValueError("minutes must be an integer")
+    return max(1, min(minutes, MAX_STATS_MINUTES))
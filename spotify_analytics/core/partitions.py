@@ -0,0 +1,92 @@
+"""
+ListeningHistory is range-partitioned by played_at, one partition per
+calendar year (PostgreSQL only; other backends keep a plain table).
+"""
+from django.db import connections, transaction
+
+TABLE = "core_listeninghistory"
+FIRST_YEAR = 2008
+
+_known_partitions = set()
+
+
+def partition_name(year):
+    return f"{TABLE}_y{year}"
+
+
+def create_partition_sql(year):
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(year)} PARTITION OF {TABLE} "
+        f"FOR VALUES FROM ('{year}-01-01 00:00:00+00') TO ('{year + 1}-01-01 00:00:00+00')"
+    )
+
+
+def is_partitioned(using="default"):
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass", [TABLE])
+        return cursor.fetchone() is not None
+
+
+def ensure_partitions(years, using="default"):
+    """
+    Create the yearly partitions ``years`` need before rows are written to
+    them. Call it before opening the transaction that writes the rows:
+    every partition is created in its own short transaction, so the lock
+    it takes on the parent isn't held for the whole write, and a writer
+    that rolls back can't take the partition with it.
+    """
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return
+
+    missing = {partition_name(year): year for year in years if partition_name(year) not in _known_partitions}
+    for name, year in sorted(missing.items()):
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            # Serializes workers creating the same partition; CREATE TABLE
+            # IF NOT EXISTS alone can still collide on pg_type. Creating a
+            # partition locks the parent, so only do it when it's missing.
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [name])
+            cursor.execute("SELECT to_regclass(%s) IS NULL", [name])
+            if cursor.fetchone()[0]:
+                cursor.execute(create_partition_sql(year))
+            # Inside a caller's transaction the partition only exists once
+            # that commits.
+            transaction.on_commit(lambda name=name: _known_partitions.add(name), using=using)
+
+
+def history_partitions(using="default"):
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = %s::regclass ORDER BY 1",
+            [TABLE],
+        )
+        return [name for name, in cursor.fetchall()]
+
+
+def purge_user_history(user_id, batch_size=10_000, using="default"):
+    """
+    Delete a user's listens partition by partition in short batches, so no
+    single statement or transaction touches the whole history.
+    """
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        from spotify_analytics.core.models import ListeningHistory
+
+        return ListeningHistory.objects.using(using).filter(user_id=user_id).delete()[0]
+
+    deleted = 0
+    for partition in history_partitions(using) if is_partitioned(using) else [TABLE]:
+        while True:
+            with transaction.atomic(using=using), connection.cursor() as cursor:
+                cursor.execute(
+                    f"DELETE FROM {partition} WHERE ctid = ANY(ARRAY("
+                    f"SELECT ctid FROM {partition} WHERE user_id = %s LIMIT %s))",
+                    [user_id, batch_size],
+                )
+                deleted += cursor.rowcount
+            if cursor.rowcount < batch_size:
+                break
+    return deleted
@@ -0,0 +1,11 @@
+from celery import shared_task
+from django.utils import timezone
+
+from spotify_analytics.core.partitions import ensure_partitions
+
+
+@shared_task(bind=True)
+def create_history_partitions(self):
+    """Create this and next year's history partitions ahead of the first listen that needs them."""
+    year = timezone.now().year
+    ensure_partitions([year, year + 1])
@@ -0,0 +1,81 @@
+import json
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from spotify_analytics.core.loaders import bulk_load, supports_copy
+from spotify_analytics.imports.models import ImportJob, ParsedSpotifyListen
+from spotify_analytics.imports.tasks import PARSED_LISTEN_FIELDS, iter_parsed_listens
+from spotify_analytics.users.models import User
+
+
+def write_synthetic_history(f, rows):
+    start = datetime(2015, 1, 1, tzinfo=timezone.utc)
+    platforms = ["android", "ios", "windows", "osx", "web_player"]
+    reasons = ["trackdone", "fwdbtn", "clickrow", "backbtn", "playbtn"]
+
+    f.write("[")
+    for i in range(rows):
+        if i:
+            f.write(",")
+        json.dump({
+            "ts": (start + timedelta(minutes=3 * i)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "platform": random.choice(platforms),
+            "ms_played": random.randint(0, 300_000),
+            "ip_addr": f"10.0.{random.randint(0, 255)}.{random.randint(0, 255)}",
+            "spotify_track_uri": f"spotify:track:{random.randrange(50_000):022d}",
+            "reason_start": random.choice(reasons),
+            "reason_end": random.choice(reasons),
+            "shuffle": random.random() < 0.3,
+            "skipped": random.random() < 0.2,
+            "offline": False,
+            "offline_timestamp": None,
+        }, f)
+    f.write("]")
+
+
+class Command(BaseCommand):
+    help = "Compare bulk_create and COPY write paths for staging rows on one synthetic file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=500_000)
+
+    def handle(self, *args, rows, **options):
+        if not supports_copy():
+            raise CommandError("COPY benchmark requires a PostgreSQL database.")
+
+        with tempfile.TemporaryFile("w+") as f:
+            write_synthetic_history(f, rows)
+
+            for label, use_copy in (("bulk_create", False), ("COPY", True)):
+                f.seek(0)
+                elapsed = self.run(f, use_copy)
+                self.stdout.write(
+                    f"{label:>12}: {rows} rows in {elapsed:.2f}s "
+                    f"({rows / elapsed:,.0f} rows/s)"
+                )
+
+    def run(self, f, use_copy):
+        # Everything happens inside a rolled back transaction so the
+        # benchmark leaves no users, jobs or staging rows behind.
+        with transaction.atomic():
+            user = User.objects.create(username=f"bench-{time.time_ns()}")
+            import_job = ImportJob.objects.create(
+                user=user,
+                source_file=ContentFile(b"[]", name="benchmark.json"),
+            )
+            listens = list(iter_parsed_listens(import_job, f))
+
+            started_at = time.monotonic()
+            bulk_load(ParsedSpotifyListen, PARSED_LISTEN_FIELDS, listens, use_copy=use_copy)
+            elapsed = time.monotonic() - started_at
+
+            transaction.set_rollback(True)
+
+        import_job.source_file.delete(save=False)
+        return elapsed
@@ -0,0 +1,103 @@
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+
+from spotify_analytics.spotify.client import request_counter
+
+SUMMED_KEYS = ("rows", "seconds", "queries", "http_requests")
+PEAK_KEYS = ("peak_rss_kb", "rss_growth_kb")
+
+RSS_SAMPLE_INTERVAL = 0.05
+PAGE_KB = os.sysconf("SC_PAGE_SIZE") // 1024
+
+
+def rss_kb():
+    """
+    Current resident set size. Without /proc, the process' lifetime peak
+    is the closest there is.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * PAGE_KB
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class RssSampler(threading.Thread):
+    """Samples rss_kb() in the background until stopped, keeping the highest."""
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.start_kb = self.peak_kb = rss_kb()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(RSS_SAMPLE_INTERVAL):
+            self.peak_kb = max(self.peak_kb, rss_kb())
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        self.peak_kb = max(self.peak_kb, rss_kb())
+
+
+@contextmanager
+def track_stage(metrics, name):
+    """
+    Record wall time, DB queries, Spotify HTTP requests and the peak RSS
+    of the wrapped block into ``metrics[name]``. RSS is sampled while the
+    block runs, so the peak is the stage's own rather than the worker's
+    lifetime high-water mark; ``rss_growth_kb`` is how far it rose above
+    the RSS the stage started with. The block sets ``stage["rows"]`` itself.
+    """
+    stage = {"rows": 0}
+    queries = 0
+
+    def count_queries(execute, sql, params, many, context):
+        nonlocal queries
+        queries += 1
+        return execute(sql, params, many, context)
+
+    http_requests = request_counter.value
+    rss = RssSampler()
+    rss.start()
+    started_at = time.monotonic()
+    try:
+        with connection.execute_wrapper(count_queries):
+            yield stage
+    finally:
+        elapsed = time.monotonic() - started_at
+        rss.stop()
+        stage.update({
+            "seconds": round(elapsed, 3),
+            "rows_per_sec": round(stage["rows"] / elapsed) if elapsed else stage["rows"],
+            "queries": queries,
+            "http_requests": request_counter.value - http_requests,
+            "peak_rss_kb": rss.peak_kb,
+            "rss_growth_kb": rss.peak_kb - rss.start_kb,
+        })
+        metrics[name] = stage
+
+
+def merge_stage_metrics(metrics_list):
+    """
+    Combine per-chunk stage metrics into job totals: counters and time are
+    summed, peak RSS and growth are the highest seen by any worker.
+    """
+    merged = {}
+    for metrics in metrics_list:
+        for name, stage in metrics.items():
+            total = merged.setdefault(name, {key: 0 for key in SUMMED_KEYS + PEAK_KEYS})
+            for key in SUMMED_KEYS:
+                total[key] += stage.get(key, 0)
+            for key in PEAK_KEYS:
+                total[key] = max(total[key], stage.get(key, 0))
+
+    for total in merged.values():
+        total["seconds"] = round(total["seconds"], 3)
+        total["rows_per_sec"] = round(total["rows"] / total["seconds"]) if total["seconds"] else total["rows"]
+    return merged
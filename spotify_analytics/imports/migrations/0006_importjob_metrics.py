@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imports', '0005_parsedspotifylisten_ip_addr'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='metrics',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
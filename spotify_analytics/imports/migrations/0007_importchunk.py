@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:10
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imports', '0006_importjob_metrics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportChunk',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(blank=True, default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(blank=True, default=django.utils.timezone.now)),
+                ('index', models.PositiveIntegerField()),
+                ('start_row', models.PositiveIntegerField()),
+                ('stop_row', models.PositiveIntegerField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='parsedspotifylisten',
+            name='row_number',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='parsedspotifylisten',
+            index=models.Index(fields=['import_job', 'row_number'], name='parsedlisten_job_row_idx'),
+        ),
+        migrations.AddField(
+            model_name='importchunk',
+            name='import_job',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='imports.importjob'),
+        ),
+        migrations.AddConstraint(
+            model_name='importchunk',
+            constraint=models.UniqueConstraint(fields=('import_job', 'index'), name='unique_importchunk_import_job_index'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imports', '0007_importchunk'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importchunk',
+            name='duplicates_skipped',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='duplicates_skipped',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
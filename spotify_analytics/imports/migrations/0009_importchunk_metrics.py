@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imports', '0008_duplicates_skipped'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importchunk',
+            name='metrics',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -25,6 +25,41 @@ class ImportJob(UUIDModel, TimestampedModel):
         default=Status.UPLOADED
     )
     error = models.TextField(blank=True, default="")
+    metrics = models.JSONField(blank=True, default=dict)
+    duplicates_skipped = models.PositiveIntegerField(default=0)
+
+
+class ImportChunk(UUIDModel, TimestampedModel):
+    class Status(models.TextChoices):
+        PENDING = "pending", "Pending"
+        COMPLETED = "completed", "Completed"
+        FAILED = "failed", "Failed"
+
+    import_job = models.ForeignKey(
+        ImportJob,
+        on_delete=models.CASCADE,
+        related_name="chunks"
+    )
+    index = models.PositiveIntegerField()
+    start_row = models.PositiveIntegerField()
+    stop_row = models.PositiveIntegerField()
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.PENDING
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+    duplicates_skipped = models.PositiveIntegerField(default=0)
+    metrics = models.JSONField(blank=True, default=dict)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["import_job", "index"],
+                name="unique_importchunk_import_job_index"
+            ),
+        ]
 
 
 class ParsedSpotifyListen(UUIDModel, TimestampedModel):
@@ -44,3 +79,12 @@ class ParsedSpotifyListen(UUIDModel, TimestampedModel):
     skipped = models.BooleanField()
     offline = models.BooleanField(null=True)
     offline_timestamp = models.PositiveBigIntegerField(null=True)
+    row_number = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["import_job", "row_number"],
+                name="parsedlisten_job_row_idx"
+            ),
+        ]
@@ -0,0 +1,118 @@
+import codecs
+import json
+
+READ_SIZE = 64 * 1024
+# A single array element (one listen is well under 1K) may not grow the
+# read window past this, so a malformed file fails instead of being read
+# into memory whole.
+MAX_ELEMENT_SIZE = 1024 * 1024
+
+LISTEN_KEYS = frozenset({
+    "ts",
+    "ip_addr",
+    "platform",
+    "ms_played",
+    "spotify_track_uri",
+    "reason_start",
+    "reason_end",
+    "shuffle",
+    "skipped",
+    "offline",
+    "offline_timestamp",
+})
+
+_decoder = json.JSONDecoder()
+_whitespace = " \t\n\r"
+
+
+def _read_text(f, size):
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    first = True
+    while True:
+        raw = f.read(size)
+        if isinstance(raw, bytes):
+            chunk = decoder.decode(raw, final=not raw)
+        else:
+            chunk = raw
+            if first and chunk.startswith("\ufeff"):
+                chunk = chunk[1:]
+            first = False
+
+        if chunk:
+            yield chunk
+        elif not raw:
+            return
+
+
+def iter_json_array(f, read_size=READ_SIZE):
+    """
+    Yield the elements of a top-level JSON array one by one, holding only
+    the current read window in memory instead of the whole document.
+    """
+    reader = _read_text(f, read_size)
+    buf = ""
+    pos = 0
+    eof = False
+
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = next(reader, None)
+        if chunk is None:
+            eof = True
+            return False
+        buf = buf[pos:] + chunk
+        pos = 0
+        return True
+
+    def refill():
+        if len(buf) - pos > max(MAX_ELEMENT_SIZE, read_size):
+            raise ValueError(f"JSON array element larger than {MAX_ELEMENT_SIZE} characters")
+        return not eof and fill()
+
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in _whitespace:
+                pos += 1
+            if pos < len(buf) or not fill():
+                return
+
+    skip_whitespace()
+    if pos >= len(buf) or buf[pos] != "[":
+        raise ValueError("Expected a top-level JSON array")
+    pos += 1
+
+    skip_whitespace()
+    if pos < len(buf) and buf[pos] == "]":
+        return
+
+    while True:
+        skip_whitespace()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if refill():
+                    continue
+                raise
+            # A scalar cut at the window edge decodes "successfully" ("12"
+            # of "125", or of "12.5" and "12e5"), so only trust a value once
+            # a delimiter follows it.
+            after = end
+            while after < len(buf) and buf[after] in _whitespace:
+                after += 1
+            if (after == len(buf) or buf[after] not in ",]") and refill():
+                continue
+            break
+
+        pos = end
+        yield value
+
+        skip_whitespace()
+        if pos >= len(buf):
+            raise ValueError("Unexpected end of JSON array")
+        if buf[pos] == "]":
+            return
+        if buf[pos] != ",":
+            raise ValueError("Expected ',' or ']' between array elements")
+        pos += 1
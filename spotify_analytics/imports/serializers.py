@@ -1,6 +1,12 @@
-import json
+from itertools import islice
+
+from django.conf import settings
 from rest_framework import serializers
 
+from spotify_analytics.imports.models import ImportChunk, ImportJob
+from spotify_analytics.imports.parsers import LISTEN_KEYS, iter_json_array
+
+
 class MultipleFileUploadSerializer(serializers.Serializer):
     files = serializers.ListField(
         child=serializers.FileField(),
@@ -14,13 +20,51 @@ class MultipleFileUploadSerializer(serializers.Serializer):
             #         f"{f.name} перевищує ліміт."
             #     )
 
+            # Only a prefix of each file is checked here; the worker is the
+            # one place that parses the whole upload.
             try:
                 f.seek(0)
-                json.load(f)
+                rows = iter_json_array(f)
+                for row in islice(rows, settings.IMPORT_VALIDATION_SAMPLE_ROWS):
+                    if not isinstance(row, dict) or not LISTEN_KEYS <= row.keys():
+                        raise serializers.ValidationError(
+                            f"{f.name} не схожий на історію прослуховувань Spotify"
+                        )
                 f.seek(0)
-            except Exception:
+            except ValueError:
                 raise serializers.ValidationError(
                     f"{f.name} невалідний JSON"
                 )
 
         return files
+
+
+class ImportChunkSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ImportChunk
+        fields = [
+            "index",
+            "start_row",
+            "stop_row",
+            "status",
+            "attempts",
+            "error",
+            "duplicates_skipped",
+            "metrics",
+        ]
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    chunks = ImportChunkSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = ImportJob
+        fields = [
+            "id",
+            "status",
+            "error",
+            "duplicates_skipped",
+            "metrics",
+            "chunks",
+            "created_at",
+        ]
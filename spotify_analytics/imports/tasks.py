@@ -1,51 +1,126 @@
-import json
-from concurrent.futures import ThreadPoolExecutor, as_completed
-
-from celery import shared_task
-from django.db import transaction
-from django.utils.dateparse import parse_datetime, parse_date
-
-from spotify_analytics.core.models import Artist, Album, Track, ListeningHistory
-from spotify_analytics.imports.models import ImportJob, ParsedSpotifyListen
+from datetime import timedelta, timezone
+
+from celery import chain, chord, group, shared_task
+from celery.utils.log import get_task_logger
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+from django.db.models import Max, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils.dateparse import parse_datetime
+
+from spotify_analytics.analytics.rollups import refresh_rollups
+from spotify_analytics.analytics.tasks import warm_analytics_cache
+from spotify_analytics.core.geo import resolve_locations
+from spotify_analytics.core.loaders import bulk_load
+from spotify_analytics.core.partitions import ensure_partitions
+from spotify_analytics.core.models import (
+    ListeningHistory,
+    PlaybackReason,
+    Platform,
+    Track,
+    listening_dedup_key,
+)
+from spotify_analytics.imports.models import ImportChunk, ImportJob, ParsedSpotifyListen
+from spotify_analytics.imports.metrics import merge_stage_metrics, track_stage
+from spotify_analytics.imports.parsers import iter_json_array
+from spotify_analytics.spotify.catalog import fetch_missing_tracks, lookup_ids, upsert_tracks
 from spotify_analytics.spotify.services import SpotifyService
+from spotify_analytics.spotify.sync import replace_synced_listens
+
+logger = get_task_logger(__name__)
+
+
+PARSED_LISTEN_FIELDS = (
+    "import_job_id",
+    "ip_addr",
+    "ts",
+    "platform",
+    "ms_played",
+    "spotify_track_id",
+    "reason_start",
+    "reason_end",
+    "shuffle",
+    "skipped",
+    "offline",
+    "offline_timestamp",
+    "row_number",
+)
+
+HISTORY_FIELDS = (
+    "user_id",
+    "track_id",
+    "ip_addr",
+    "location_id",
+    "played_at",
+    "platform_id",
+    "ms_played",
+    "reason_start_id",
+    "reason_end_id",
+    "shuffle",
+    "skipped",
+    "offline",
+    "offline_timestamp",
+    "dedup_key",
+)
+
+
+def iter_parsed_listens(import_job, f):
+    row_number = 0
+    for row in iter_json_array(f):
+        spotify_track_uri = row.get("spotify_track_uri")
+        if not spotify_track_uri or not spotify_track_uri.startswith("spotify:track:"):
+            continue
+
+        yield (
+            import_job.id,
+            row["ip_addr"],
+            parse_datetime(row["ts"]),
+            row["platform"],
+            row["ms_played"],
+            spotify_track_uri.split(":")[-1],
+            row["reason_start"],
+            row["reason_end"],
+            row["shuffle"],
+            row["skipped"],
+            row["offline"],
+            row["offline_timestamp"],
+            row_number,
+        )
+        row_number += 1
 
 
 @shared_task(bind=True)
 def parse_import_job_file(self, import_job_id):
     try:
         import_job = ImportJob.objects.get(id=import_job_id)
-        with import_job.source_file.open("r") as f:
-            data = json.load(f)
-
-        listens_to_create = []
-        for row in data:
-            spotify_track_uri = row.get("spotify_track_uri")
-            if not spotify_track_uri or not spotify_track_uri.startswith("spotify:track:"):
-                continue
 
-            listens_to_create.append(
-                ParsedSpotifyListen(
+        with transaction.atomic():
+            with track_stage(import_job.metrics, "parse") as stage:
+                with import_job.source_file.open("rb") as f:
+                    rows = stage["rows"] = bulk_load(
+                        ParsedSpotifyListen,
+                        PARSED_LISTEN_FIELDS,
+                        iter_parsed_listens(import_job, f),
+                        batch_size=settings.IMPORT_PARSE_BATCH_SIZE,
+                    )
+
+            import_job.status = ImportJob.Status.PARSED
+            import_job.save(update_fields=["status", "metrics"])
+
+            chunk_size = settings.IMPORT_CHUNK_SIZE
+            ImportChunk.objects.bulk_create([
+                ImportChunk(
                     import_job=import_job,
-                    ip_addr=row["ip_addr"],
-                    ts=parse_datetime(row["ts"]),
-                    platform=row["platform"],
-                    ms_played=row["ms_played"],
-                    spotify_track_id=spotify_track_uri.split(":")[-1],
-                    reason_start=row["reason_start"],
-                    reason_end=row["reason_end"],
-                    shuffle=row["shuffle"],
-                    skipped=row["skipped"],
-                    offline=row["offline"],
-                    offline_timestamp=row["offline_timestamp"]
+                    index=index,
+                    start_row=start_row,
+                    stop_row=min(start_row + chunk_size, rows),
                 )
-            )
+                for index, start_row in enumerate(range(0, rows, chunk_size))
+            ])
 
-        with transaction.atomic():
-            ParsedSpotifyListen.objects.bulk_create(listens_to_create, batch_size=500)
-            import_spotify_tracks.delay(import_job_id)
+            transaction.on_commit(lambda: import_spotify_tracks.delay(import_job_id))
 
-        import_job.status = ImportJob.Status.PARSED
-        import_job.save(update_fields=["status"])
+        logger.info("Parsed import job %s: %s", import_job_id, import_job.metrics["parse"])
 
     except Exception as e:
         import_job.status = ImportJob.Status.FAILED
@@ -54,217 +129,260 @@ def parse_import_job_file(self, import_job_id):
         raise e
 
 
+def dispatch_import_chunks(import_job, chunks):
+    """
+    Run ``chunks`` through at most IMPORT_CHUNK_CONCURRENCY parallel lanes
+    and finish the job once every lane is done.
+    """
+    chunk_ids = [chunk.id for chunk in chunks]
+    if not chunk_ids:
+        return finalize_import_job.delay(import_job.id)
+
+    lanes = min(settings.IMPORT_CHUNK_CONCURRENCY, len(chunk_ids))
+    header = group(
+        chain(*[import_spotify_tracks_chunk.si(chunk_id) for chunk_id in chunk_ids[lane::lanes]])
+        for lane in range(lanes)
+    )
+    return chord(header)(finalize_import_job.si(import_job.id))
+
+
 @shared_task(bind=True)
 def import_spotify_tracks(self, import_job_id):
     import_job = ImportJob.objects.get(id=import_job_id)
-    service = SpotifyService()
+    import_job.status = ImportJob.Status.FETCHING
+    import_job.save(update_fields=["status"])
 
-    parsed_listens = ParsedSpotifyListen.objects.filter(import_job=import_job)
+    dispatch_import_chunks(import_job, import_job.chunks.order_by("index"))
 
-    spotify_ids = list(
-        set(
-            parsed_listens
-            .values_list("spotify_track_id", flat=True)
-        )
-    )
 
-    # -------------------------------
-    # 1. Забезпечуємо існування ВСІХ Track
-    # -------------------------------
+@shared_task(bind=True, max_retries=settings.IMPORT_CHUNK_MAX_RETRIES)
+def import_spotify_tracks_chunk(self, chunk_id, attempts=None):
+    chunk = ImportChunk.objects.select_related("import_job").get(id=chunk_id)
+    if chunk.status == ImportChunk.Status.COMPLETED:
+        return
 
-    existing_track_ids = set(
-        Track.objects
-        .filter(spotify_id__in=spotify_ids)
-        .values_list("spotify_id", flat=True)
-    )
+    # Automatic retries carry the count along rather than saving it on a
+    # connection that may be the thing that broke.
+    chunk.attempts = (chunk.attempts if attempts is None else attempts) + 1
+    try:
+        # Partitions and the catalog are committed up front, never inside
+        # (and never rolled back with) the chunk's transaction, which only
+        # writes the history.
+        played = chunk_listens(chunk).aggregate(first=Min("ts"), last=Max("ts"))
+        if played["first"]:
+            ensure_partitions(range(played["first"].year, played["last"].year + 1))
 
-    ids_to_fetch = [sid for sid in spotify_ids if sid not in existing_track_ids]
-
-    tracks_data = {}
-    if ids_to_fetch:
-        BATCH_SIZE = 50
-        MAX_WORKERS = 3
-
-        batches = [
-            ids_to_fetch[i:i + BATCH_SIZE]
-            for i in range(0, len(ids_to_fetch), BATCH_SIZE)
-        ]
-
-        from concurrent.futures import ThreadPoolExecutor, as_completed
-        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            futures = {
-                executor.submit(service.get_tracks, batch): batch
-                for batch in batches
-            }
-            for future in as_completed(futures):
-                result = future.result()
-                for t in result:
-                    if t:
-                        tracks_data[t["id"]] = t
-
-    # -------------------------------
-    # 2. Артисти
-    # -------------------------------
-
-    artist_data = {}
-    for t in tracks_data.values():
-        for a in t["artists"]:
-            artist_data[a["id"]] = a
-        for a in t["album"]["artists"]:
-            artist_data[a["id"]] = a
-
-    existing_artist_ids = set(
-        Artist.objects
-        .filter(spotify_id__in=artist_data.keys())
-        .values_list("spotify_id", flat=True)
-    )
+        catalog = import_chunk_catalog(chunk)
 
-    Artist.objects.bulk_create(
-        [
-            Artist(
-                spotify_id=a_id,
-                name=a["name"],
-                spotify_url=a["external_urls"]["spotify"],
+        with transaction.atomic():
+            write_chunk_history(chunk, catalog)
+            chunk.status = ImportChunk.Status.COMPLETED
+            chunk.error = ""
+            chunk.save(update_fields=["status", "error", "attempts", "duplicates_skipped", "metrics"])
+
+    except OperationalError as e:
+        # Deadlocks, serialization failures and dropped connections are
+        # transient: the chunk runs again from scratch after a backoff.
+        if self.request.retries < self.max_retries:
+            logger.warning("Import chunk %s hit %s, retrying", chunk_id, e)
+            raise self.retry(
+                args=[chunk_id],
+                kwargs={"attempts": chunk.attempts},
+                exc=e,
+                countdown=2 ** self.request.retries,
             )
-            for a_id, a in artist_data.items()
-            if a_id not in existing_artist_ids
-        ],
-        ignore_conflicts=True
+        fail_chunk(chunk, e)
+
+    except Exception as e:
+        fail_chunk(chunk, e)
+
+
+def fail_chunk(chunk, error):
+    # Failures stay on the chunk so the rest of the chord can finish
+    # and this chunk can be retried on its own.
+    logger.exception("Import chunk %s failed", chunk.id)
+    chunk.status = ImportChunk.Status.FAILED
+    chunk.error = str(error)
+    # Reconnect first if the error was the connection dropping. Inside a
+    # transaction (the test suite's) there's nothing to reconnect to.
+    if not connection.in_atomic_block:
+        connection.close_if_unusable_or_obsolete()
+    chunk.save(update_fields=["status", "error", "attempts"])
+
+
+def chunk_listens(chunk):
+    return ParsedSpotifyListen.objects.filter(
+        import_job_id=chunk.import_job_id,
+        row_number__gte=chunk.start_row,
+        row_number__lt=chunk.stop_row,
     )
 
-    artist_objs = {
-        a.spotify_id: a
-        for a in Artist.objects.filter(spotify_id__in=artist_data.keys())
-    }
 
-    # -------------------------------
-    # 3. Альбоми
-    # -------------------------------
+def import_chunk_catalog(chunk):
+    """
+    Fetch and store the tracks, locations, platforms and playback reasons
+    the chunk's listens refer to, each committed on its own, and return
+    their ``{value: pk}`` maps.
+    """
+    service = SpotifyService()
+    metrics = chunk.metrics = {}
 
-    album_data = {
-        t["album"]["id"]: t["album"]
-        for t in tracks_data.values()
-    }
+    parsed_listens = chunk_listens(chunk)
 
-    existing_album_ids = set(
-        Album.objects
-        .filter(spotify_id__in=album_data.keys())
-        .values_list("spotify_id", flat=True)
+    spotify_ids = list(
+        parsed_listens
+        .values_list("spotify_track_id", flat=True)
+        .distinct()
     )
 
-    Album.objects.bulk_create(
-        [
-            Album(
-                spotify_id=alb_id,
-                name=alb["name"],
-                spotify_url=alb["external_urls"]["spotify"],
-                type=alb["album_type"],
-                release_date=parse_date(alb["release_date"])
-                if alb.get("release_date_precision") == "day"
-                else None,
-                image=alb["images"][0]["url"] if alb.get("images") else None,
-            )
-            for alb_id, alb in album_data.items()
-            if alb_id not in existing_album_ids
-        ],
-        ignore_conflicts=True
-    )
+    with track_stage(metrics, "lookup_tracks") as stage:
+        track_ids, missing = lookup_ids(Track, "track", spotify_ids)
+        stage["rows"] = len(track_ids)
 
-    album_objs = {
-        a.spotify_id: a
-        for a in Album.objects.filter(spotify_id__in=album_data.keys())
-    }
+    with track_stage(metrics, "fetch_tracks") as stage:
+        tracks_data = fetch_missing_tracks(
+            service,
+            [sid for sid in spotify_ids if sid not in track_ids and sid not in missing]
+        )
+        stage["rows"] = len(tracks_data)
 
-    AlbumArtist = Album.artists.through
-    AlbumArtist.objects.bulk_create(
-        [
-            AlbumArtist(
-                album_id=album_objs[alb["id"]].id,
-                artist_id=artist_objs[a["id"]].id,
-            )
-            for alb in album_data.values()
-            for a in alb["artists"]
-            if alb["id"] in album_objs and a["id"] in artist_objs
-        ],
-        ignore_conflicts=True
-    )
+    with track_stage(metrics, "upsert_catalog") as stage:
+        track_ids.update(upsert_tracks(tracks_data))
+        stage["rows"] = len(tracks_data)
 
-    # -------------------------------
-    # 4. Треки
-    # -------------------------------
-
-    Track.objects.bulk_create(
-        [
-            Track(
-                spotify_id=t["id"],
-                name=t["name"],
-                duration_ms=t["duration_ms"],
-                explicit=t["explicit"],
-                popularity=t.get("popularity"),
-                spotify_url=t["external_urls"]["spotify"],
-                album=album_objs.get(t["album"]["id"]),
-                release_date=parse_date(t["album"]["release_date"])
-                if t["album"].get("release_date_precision") == "day"
-                else None,
-                image=(
-                    album_objs[t["album"]["id"]].image
-                    if t["album"]["id"] in album_objs
-                    else None
-                ),
-            )
-            for t in tracks_data.values()
-        ],
-        ignore_conflicts=True
+    with track_stage(metrics, "resolve_locations") as stage:
+        location_ids = resolve_locations(parsed_listens.values_list("ip_addr", flat=True).distinct())
+        stage["rows"] = len(location_ids)
+
+    platform_ids = Platform.ids_for(
+        parsed_listens.values_list("platform", flat=True).distinct()
+    )
+    reason_ids = PlaybackReason.ids_for(
+        set(parsed_listens.values_list("reason_start", flat=True).distinct())
+        | set(parsed_listens.values_list("reason_end", flat=True).distinct())
     )
 
-    track_objs = {
-        t.spotify_id: t
-        for t in Track.objects.filter(spotify_id__in=spotify_ids)
+    return {
+        "track": track_ids,
+        "location": location_ids,
+        "platform": platform_ids,
+        "reason": reason_ids,
     }
 
-    # -------------------------------
-    # 5. Track ↔ Artist
-    # -------------------------------
 
-    TrackArtist = Track.artists.through
-    TrackArtist.objects.bulk_create(
-        [
-            TrackArtist(
-                track_id=track_objs[t["id"]].id,
-                artist_id=artist_objs[a["id"]].id,
-            )
-            for t in tracks_data.values()
-            for a in t["artists"]
-            if t["id"] in track_objs and a["id"] in artist_objs
-        ],
-        ignore_conflicts=True
-    )
+def write_chunk_history(chunk, catalog):
+    import_job = chunk.import_job
+    parsed_listens = chunk_listens(chunk)
+    track_ids = catalog["track"]
+    location_ids = catalog["location"]
+    platform_ids = catalog["platform"]
+    reason_ids = catalog["reason"]
+
+    with track_stage(chunk.metrics, "write_history") as stage:
+        written = 0
+
+        def history_rows():
+            nonlocal written
+            for (
+                ip_addr, ts, platform, ms_played, sid, reason_start,
+                reason_end, shuffle, skipped, offline, offline_timestamp,
+            ) in iter_chunk_listens(parsed_listens, chunk):
+                if sid not in track_ids:
+                    continue
+                written += 1
+                yield (
+                    import_job.user_id,
+                    track_ids[sid],
+                    ip_addr,
+                    location_ids.get(ip_addr),
+                    ts,
+                    platform_ids[platform],
+                    ms_played,
+                    reason_ids[reason_start],
+                    reason_ids[reason_end],
+                    shuffle,
+                    skipped,
+                    offline,
+                    offline_timestamp,
+                    listening_dedup_key(ts, sid, ms_played),
+                )
 
-    # -------------------------------
-    # 6. ListeningHistory (ГОЛОВНЕ)
-    # -------------------------------
-
-    history = [
-        ListeningHistory(
-            user=import_job.user,
-            track=track_objs[parsed.spotify_track_id],
-            ip_addr=parsed.ip_addr,
-            played_at=parsed.ts,
-            platform=parsed.platform,
-            ms_played=parsed.ms_played,
-            spotify_track_id=parsed.spotify_track_id,
-            reason_start=parsed.reason_start,
-            reason_end=parsed.reason_end,
-            shuffle=parsed.shuffle,
-            skipped=parsed.skipped,
-            offline=parsed.offline,
-            offline_timestamp=parsed.offline_timestamp,
+        inserted = bulk_load(
+            ListeningHistory,
+            HISTORY_FIELDS,
+            history_rows(),
+            batch_size=settings.IMPORT_WRITE_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        chunk.duplicates_skipped = written - inserted
+        stage["rows"] = inserted
+
+        played = parsed_listens.aggregate(first=Min("ts"), last=Max("ts"))
+        if played["first"]:
+            replace_synced_listens(import_job.user_id, played["first"], played["last"])
+
+
+def iter_chunk_listens(parsed_listens, chunk):
+    """
+    Yield the chunk's staging rows as tuples in row_number order, reading
+    IMPORT_WRITE_BATCH_SIZE rows at a time by row_number range so neither
+    model instances nor the whole chunk are ever held in memory.
+    """
+    batch_size = settings.IMPORT_WRITE_BATCH_SIZE
+    for start in range(chunk.start_row, chunk.stop_row, batch_size):
+        yield from (
+            parsed_listens
+            .filter(row_number__gte=start, row_number__lt=min(start + batch_size, chunk.stop_row))
+            .order_by("row_number")
+            .values_list(*PARSED_LISTEN_FIELDS[1:-1])
         )
-        for parsed in parsed_listens
-        if parsed.spotify_track_id in track_objs
-    ]
 
-    ListeningHistory.objects.bulk_create(history, batch_size=500)
 
-    import_job.status = ImportJob.Status.COMPLETED
-    import_job.save(update_fields=["status"])
+@shared_task(bind=True)
+def finalize_import_job(self, import_job_id):
+    import_job = ImportJob.objects.get(id=import_job_id)
+    import_job.duplicates_skipped = (
+        import_job.chunks.aggregate(total=Sum("duplicates_skipped"))["total"] or 0
+    )
+    import_job.metrics.update(merge_stage_metrics(
+        import_job.chunks.values_list("metrics", flat=True)
+    ))
+
+    # Only the days this file covers can have new listens, plus the days
+    # next to them: a synced listen the file replaced may sit just across
+    # midnight.
+    days = set(
+        import_job.parsed_listens
+        .annotate(day=TruncDate("ts", tzinfo=timezone.utc))
+        .values_list("day", flat=True)
+        .distinct()
+    )
+    with track_stage(import_job.metrics, "rollups") as stage:
+        stage["rows"] = refresh_rollups(
+            import_job.user_id,
+            {day + timedelta(days=offset) for day in days for offset in (-1, 0, 1)},
+        )
+
+    failed = import_job.chunks.filter(status=ImportChunk.Status.FAILED).count()
+    if failed:
+        import_job.status = ImportJob.Status.FAILED
+        import_job.error = f"{failed} of {import_job.chunks.count()} chunks failed"
+    else:
+        import_job.status = ImportJob.Status.COMPLETED
+        import_job.error = ""
+    import_job.save(update_fields=["status", "error", "duplicates_skipped", "metrics"])
+
+    if import_job.status == ImportJob.Status.COMPLETED:
+        warm_analytics_cache.delay(import_job.user_id)
+
+
+@shared_task(bind=True)
+def retry_failed_import_chunks(self, import_job_id):
+    import_job = ImportJob.objects.get(id=import_job_id)
+    chunks = list(import_job.chunks.filter(status=ImportChunk.Status.FAILED).order_by("index"))
+
+    import_job.status = ImportJob.Status.FETCHING
+    import_job.error = ""
+    import_job.save(update_fields=["status", "error"])
+
+    dispatch_import_chunks(import_job, chunks)
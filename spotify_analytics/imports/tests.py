@@ -0,0 +1,184 @@
+import io
+import json
+import tempfile
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.db import OperationalError
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from spotify_analytics.analytics.models import HourlyRollup
+from spotify_analytics.core.models import Album, ListeningHistory, Track
+from spotify_analytics.imports import tasks
+from spotify_analytics.imports.models import ImportChunk, ImportJob
+from spotify_analytics.imports.parsers import iter_json_array
+from spotify_analytics.imports.tasks import parse_import_job_file
+from spotify_analytics.spotify.catalog import catalog_cache
+from spotify_analytics.spotify.sync import sync_recently_played
+from spotify_analytics.users.models import User
+
+SPOTIFY_ID = "4uLU6hMCjMI75M1A2tKUQC"
+
+
+def export_row(ts, ms_played):
+    return {
+        "ts": ts,
+        "ip_addr": "127.0.0.1",
+        "platform": "android",
+        "ms_played": ms_played,
+        "spotify_track_uri": f"spotify:track:{SPOTIFY_ID}",
+        "reason_start": "clickrow",
+        "reason_end": "trackdone",
+        "shuffle": False,
+        "skipped": False,
+        "offline": False,
+        "offline_timestamp": None,
+    }
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ImportTestCase(TestCase):
+    def setUp(self):
+        # Cached pks would outlive the rows each test rolls back.
+        catalog_cache.clear()
+        self.user = User.objects.create(username="listener")
+        album = Album.objects.create(name="Album", type="album", spotify_id="0" * 22, spotify_url="")
+        self.track = Track.objects.create(name="Track", spotify_id=SPOTIFY_ID, spotify_url="", album=album)
+
+    def import_export(self, rows):
+        import_job = ImportJob.objects.create(
+            user=self.user,
+            source_file=ContentFile(json.dumps(rows).encode(), name="history.json"),
+        )
+        # The catalog already has the track, so Spotify is never called.
+        with (
+            mock.patch("spotify_analytics.imports.tasks.SpotifyService"),
+            self.captureOnCommitCallbacks(execute=True),
+        ):
+            parse_import_job_file(import_job.id)
+        import_job.refresh_from_db()
+        return import_job
+
+
+class OverlappingExportTests(ImportTestCase):
+    def sync(self, played_at):
+        item = {"played_at": played_at, "track": {"id": SPOTIFY_ID, "duration_ms": 200_000}}
+        with (
+            mock.patch("spotify_analytics.spotify.sync.SpotifyService") as service,
+            mock.patch("spotify_analytics.spotify.sync.fetch_recently_played", return_value=([item], 0)),
+            mock.patch("spotify_analytics.spotify.sync.resolve_tracks", return_value={SPOTIFY_ID: self.track.id}),
+        ):
+            service.return_value.token = "token"
+            return sync_recently_played(self.user)
+
+    def test_export_replaces_synced_listens_of_the_same_plays(self):
+        # The API reports the play with ms precision, the export a few
+        # seconds off with second precision and the real ms_played.
+        self.assertEqual(self.sync("2025-03-01T10:00:03.123Z"), 1)
+
+        import_job = self.import_export([
+            export_row("2025-03-01T10:00:00Z", 150_000),
+            export_row("2025-03-01T12:00:00Z", 180_000),
+        ])
+        self.assertEqual(import_job.status, ImportJob.Status.COMPLETED, import_job.error)
+
+        listens = ListeningHistory.objects.filter(user=self.user)
+        self.assertEqual(listens.count(), 2)
+        self.assertFalse(listens.filter(source=ListeningHistory.Source.RECENTLY_PLAYED).exists())
+        self.assertEqual(
+            HourlyRollup.objects.filter(user=self.user).aggregate(streams=Sum("streams"))["streams"],
+            2,
+        )
+
+        # Syncing the same play again doesn't count it twice either.
+        self.assertEqual(self.sync("2025-03-01T10:00:03.123Z"), 0)
+        self.assertEqual(listens.count(), 2)
+
+
+class ChunkRetryTests(ImportTestCase):
+    rows = [export_row("2025-03-01T10:00:00Z", 150_000)]
+
+    def test_deadlocked_chunk_is_retried(self):
+        with mock.patch("spotify_analytics.imports.tasks.dispatch_import_chunks"):
+            import_job = self.import_export(self.rows)
+        chunk = import_job.chunks.get()
+
+        deadlocks = [OperationalError("deadlock detected")]
+        write_chunk_history = tasks.write_chunk_history
+
+        def deadlock_once(*args):
+            if deadlocks:
+                raise deadlocks.pop()
+            write_chunk_history(*args)
+
+        with (
+            mock.patch("spotify_analytics.imports.tasks.SpotifyService"),
+            mock.patch("spotify_analytics.imports.tasks.write_chunk_history", side_effect=deadlock_once),
+        ):
+            # Eager tasks run the retry inline, then still raise Retry.
+            tasks.import_spotify_tracks_chunk.apply((chunk.id,), throw=False)
+
+        chunk.refresh_from_db()
+        self.assertEqual(chunk.status, ImportChunk.Status.COMPLETED, chunk.error)
+        self.assertEqual(chunk.attempts, 2)
+        self.assertEqual(ListeningHistory.objects.filter(user=self.user).count(), 1)
+
+    def test_chunk_fails_once_retries_run_out(self):
+        with mock.patch("spotify_analytics.imports.tasks.dispatch_import_chunks"):
+            import_job = self.import_export(self.rows)
+        chunk = import_job.chunks.get()
+
+        with (
+            mock.patch("spotify_analytics.imports.tasks.SpotifyService"),
+            mock.patch(
+                "spotify_analytics.imports.tasks.write_chunk_history",
+                side_effect=OperationalError("server closed the connection unexpectedly"),
+            ),
+        ):
+            # The last retry, as the earlier attempts would have queued it.
+            retries = tasks.import_spotify_tracks_chunk.max_retries
+            tasks.import_spotify_tracks_chunk.apply((chunk.id,), {"attempts": retries}, retries=retries)
+
+        chunk.refresh_from_db()
+        self.assertEqual(chunk.status, ImportChunk.Status.FAILED)
+        self.assertEqual(chunk.attempts, tasks.import_spotify_tracks_chunk.max_retries + 1)
+        self.assertIn("server closed the connection", chunk.error)
+
+    def test_failed_chunks_are_retried_from_the_job_endpoint(self):
+        with mock.patch(
+            "spotify_analytics.imports.tasks.write_chunk_history",
+            side_effect=ValueError("boom"),
+        ):
+            import_job = self.import_export(self.rows)
+        self.assertEqual(import_job.status, ImportJob.Status.FAILED)
+        self.assertEqual(import_job.chunks.get().status, ImportChunk.Status.FAILED)
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = f"/api/imports/jobs/{import_job.id}/retry/"
+        with mock.patch("spotify_analytics.imports.tasks.SpotifyService"), self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(client.post(url).status_code, 202)
+
+        import_job.refresh_from_db()
+        self.assertEqual(import_job.status, ImportJob.Status.COMPLETED, import_job.error)
+        self.assertEqual(ListeningHistory.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(client.post(url).status_code, 400)
+
+
+class IterJsonArrayTests(SimpleTestCase):
+    document = '[12.5, 1e3, {"a": 1.25, "b": "x\\u00e9"}, -0.5E-2 , true, null, [1, 2.0], "é"]'
+
+    def test_elements_split_across_read_windows(self):
+        expected = json.loads(self.document)
+        for read_size in range(1, len(self.document.encode()) + 2):
+            with self.subTest(read_size=read_size):
+                f = io.BytesIO(self.document.encode())
+                self.assertEqual(list(iter_json_array(f, read_size=read_size)), expected)
+
+    def test_oversized_element_fails_without_reading_the_rest(self):
+        f = io.BytesIO(b'[1, "' + b"a" * 3 * 1024 * 1024 + b'"]')
+        with self.assertRaisesMessage(ValueError, "JSON array element larger than"):
+            list(iter_json_array(f, read_size=1024))
+        self.assertLess(f.tell(), 2 * 1024 * 1024)
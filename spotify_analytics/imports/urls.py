@@ -1,8 +1,16 @@
 from django.urls import path
 
-from spotify_analytics.imports.views import MultipleFileUploadView
+from spotify_analytics.imports.views import (
+    ImportJobDetailView,
+    ImportJobListView,
+    ImportJobRetryView,
+    MultipleFileUploadView,
+)
 
 app_name = "imports"
 urlpatterns = [
     path("", MultipleFileUploadView.as_view(), name="upload_files"),
+    path("jobs/", ImportJobListView.as_view(), name="job_list"),
+    path("jobs/<uuid:pk>/", ImportJobDetailView.as_view(), name="job_detail"),
+    path("jobs/<uuid:pk>/retry/", ImportJobRetryView.as_view(), name="job_retry"),
 ]
\ No newline at end of file
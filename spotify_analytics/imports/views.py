@@ -1,8 +1,9 @@
-from rest_framework import views, permissions, response, status
+from django.db.models import Prefetch
+from rest_framework import generics, views, permissions, response, status
 
-from .models import ImportJob
-from .serializers import MultipleFileUploadSerializer
-from .tasks import parse_import_job_file
+from .models import ImportChunk, ImportJob
+from .serializers import ImportJobSerializer, MultipleFileUploadSerializer
+from .tasks import parse_import_job_file, retry_failed_import_chunks
 
 
 class MultipleFileUploadView(views.APIView):
@@ -29,3 +30,47 @@ class MultipleFileUploadView(views.APIView):
             {"import_job_ids": created_jobs},
             status=status.HTTP_201_CREATED
         )
+
+
+class ImportJobMixin:
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = ImportJobSerializer
+
+    def get_queryset(self):
+        return (
+            ImportJob.objects
+            .filter(user=self.request.user)
+            .prefetch_related(
+                Prefetch("chunks", queryset=ImportChunk.objects.order_by("index"))
+            )
+            .order_by("-created_at")
+        )
+
+
+class ImportJobListView(ImportJobMixin, generics.ListAPIView):
+    pass
+
+
+class ImportJobDetailView(ImportJobMixin, generics.RetrieveAPIView):
+    pass
+
+
+class ImportJobRetryView(ImportJobMixin, generics.GenericAPIView):
+    """Run the failed chunks of a failed job again."""
+
+    def post(self, request, pk):
+        import_job = self.get_object()
+        # Claimed with a conditional update so a double submit retries once.
+        claimed = (
+            ImportJob.objects
+            .filter(id=import_job.id, status=ImportJob.Status.FAILED, chunks__status=ImportChunk.Status.FAILED)
+            .update(status=ImportJob.Status.FETCHING, error="")
+        )
+        if not claimed:
+            return response.Response(
+                {"error": "Only jobs with failed chunks can be retried"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        retry_failed_import_chunks.delay(import_job.id)
+        return response.Response(status=status.HTTP_202_ACCEPTED)
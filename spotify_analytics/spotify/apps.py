@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class SpotifyConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'spotify_analytics.spotify'
+    # "spotify" is taken by the allauth provider app.
+    label = "spotify_api"
+
+    def ready(self):
+        from spotify_analytics.spotify import signals  # noqa: F401
@@ -0,0 +1,349 @@
+import threading
+import uuid
+from collections import OrderedDict
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from spotify_analytics.core.models import Artist, Album, Track
+from spotify_analytics.spotify.coalescing import track_coalescer
+
+MISSING = "-"
+
+
+class CatalogCache:
+    """
+    spotify_id -> primary key map shared by every worker through Redis.
+
+    Ids Spotify answers with ``null`` are cached as MISSING for a shorter
+    TTL. Hits are also kept in a size-bounded in-process LRU so hot ids
+    don't cost a Redis round trip.
+    """
+
+    def __init__(self, alias="catalog"):
+        self.alias = alias
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def get_many(self, kind, spotify_ids):
+        found = {}
+        remote_ids = []
+
+        with self._lock:
+            for sid in spotify_ids:
+                pk = self._local.get((kind, sid))
+                if pk is None:
+                    remote_ids.append(sid)
+                else:
+                    self._local.move_to_end((kind, sid))
+                    found[sid] = pk
+
+        if remote_ids:
+            keys = {f"{kind}:{sid}": sid for sid in remote_ids}
+            for key, value in self.cache.get_many(keys).items():
+                sid = keys[key]
+                if value == MISSING:
+                    found[sid] = MISSING
+                else:
+                    found[sid] = uuid.UUID(value)
+                    self._remember(kind, sid, found[sid])
+
+        return found
+
+    def set_many(self, kind, pks):
+        if not pks:
+            return
+        # Rows may belong to a transaction that still can roll back, so
+        # they are only published once it commits.
+        transaction.on_commit(partial(self._store, kind, dict(pks)))
+
+    def _store(self, kind, pks):
+        self.cache.set_many(
+            {f"{kind}:{sid}": str(pk) for sid, pk in pks.items()},
+            timeout=settings.CATALOG_CACHE_TTL,
+        )
+        for sid, pk in pks.items():
+            self._remember(kind, sid, pk)
+
+    def set_missing(self, kind, spotify_ids):
+        if not spotify_ids:
+            return
+        self.cache.set_many(
+            {f"{kind}:{sid}": MISSING for sid in spotify_ids},
+            timeout=settings.CATALOG_NEGATIVE_CACHE_TTL,
+        )
+
+    def clear(self):
+        self.cache.clear()
+        with self._lock:
+            self._local.clear()
+
+    def _remember(self, kind, sid, pk):
+        with self._lock:
+            self._local[(kind, sid)] = pk
+            self._local.move_to_end((kind, sid))
+            while len(self._local) > settings.CATALOG_LOCAL_CACHE_SIZE:
+                self._local.popitem(last=False)
+
+
+catalog_cache = CatalogCache()
+
+
+def lookup_ids(model, kind, spotify_ids):
+    """
+    Return ``{spotify_id: pk}`` for the ids already known, from the cache
+    first and the database for the rest, plus the ids cached as missing.
+    """
+    spotify_ids = set(spotify_ids)
+    found = catalog_cache.get_many(kind, spotify_ids)
+    missing = {sid for sid, pk in found.items() if pk == MISSING}
+    known = {sid: pk for sid, pk in found.items() if pk != MISSING}
+
+    unresolved = spotify_ids - known.keys() - missing
+    if unresolved:
+        from_db = dict(
+            model.objects
+            .filter(spotify_id__in=unresolved)
+            .values_list("spotify_id", "id")
+        )
+        catalog_cache.set_many(kind, from_db)
+        known.update(from_db)
+
+    return known, missing
+
+
+def resolve_tracks(service, spotify_ids, tracks_data=None):
+    """
+    Make sure a Track (with its album and artists) exists for every id
+    Spotify knows about and return ``{spotify_id: track pk}``. Full track
+    payloads already at hand can be passed in ``tracks_data`` so they
+    aren't fetched again.
+    """
+    tracks_data = tracks_data or {}
+    track_ids, missing = lookup_ids(Track, "track", spotify_ids)
+    unknown = [sid for sid in spotify_ids if sid not in track_ids and sid not in missing]
+
+    new_tracks = {sid: tracks_data[sid] for sid in unknown if sid in tracks_data}
+    new_tracks.update(fetch_missing_tracks(service, [sid for sid in unknown if sid not in new_tracks]))
+    track_ids.update(upsert_tracks(new_tracks))
+    return track_ids
+
+
+def fetch_missing_tracks(service, ids_to_fetch):
+    tracks_data = {}
+    if ids_to_fetch:
+        # Ids other imports want too are fetched once, by whichever job gets them first.
+        tracks_data = track_coalescer.fetch(service, ids_to_fetch)
+
+        catalog_cache.set_missing(
+            "track",
+            [sid for sid in ids_to_fetch if sid not in tracks_data]
+        )
+
+    return tracks_data
+
+
+@transaction.atomic
+def upsert_tracks(tracks_data):
+    """
+    Create the catalog rows for ``tracks_data`` in one short transaction of
+    its own. Rows are inserted in spotify_id (and pk) order so concurrent
+    imports sharing artists, albums or tracks lock them in the same order
+    instead of deadlocking.
+    """
+    if not tracks_data:
+        return {}
+
+    # -------------------------------
+    # Артисти
+    # -------------------------------
+
+    artist_data = {}
+    for t in tracks_data.values():
+        for a in t["artists"]:
+            artist_data[a["id"]] = a
+        for a in t["album"]["artists"]:
+            artist_data[a["id"]] = a
+
+    artist_ids, _ = lookup_ids(Artist, "artist", artist_data.keys())
+
+    new_artist_ids = artist_data.keys() - artist_ids.keys()
+    if new_artist_ids:
+        Artist.objects.bulk_create(
+            [
+                Artist(
+                    spotify_id=a_id,
+                    name=artist_data[a_id]["name"],
+                    spotify_url=artist_data[a_id]["external_urls"]["spotify"],
+                )
+                for a_id in sorted(new_artist_ids)
+            ],
+            ignore_conflicts=True
+        )
+        created, _ = lookup_ids(Artist, "artist", new_artist_ids)
+        artist_ids.update(created)
+
+    # -------------------------------
+    # Альбоми
+    # -------------------------------
+
+    album_data = {
+        t["album"]["id"]: t["album"]
+        for t in tracks_data.values()
+    }
+
+    album_ids, _ = lookup_ids(Album, "album", album_data.keys())
+
+    new_album_ids = album_data.keys() - album_ids.keys()
+    if new_album_ids:
+        Album.objects.bulk_create(
+            [
+                Album(
+                    spotify_id=alb_id,
+                    name=alb["name"],
+                    spotify_url=alb["external_urls"]["spotify"],
+                    type=alb["album_type"],
+                    release_date=parse_date(alb["release_date"])
+                    if alb.get("release_date_precision") == "day"
+                    else None,
+                    image=alb["images"][0]["url"] if alb.get("images") else None,
+                )
+                for alb_id, alb in sorted(album_data.items())
+                if alb_id in new_album_ids
+            ],
+            ignore_conflicts=True
+        )
+        created, _ = lookup_ids(Album, "album", new_album_ids)
+        album_ids.update(created)
+
+    AlbumArtist = Album.artists.through
+    AlbumArtist.objects.bulk_create(
+        [
+            AlbumArtist(album_id=album_id, artist_id=artist_id)
+            for album_id, artist_id in sorted({
+                (album_ids[alb["id"]], artist_ids[a["id"]])
+                for alb in album_data.values()
+                for a in alb["artists"]
+                if alb["id"] in album_ids and a["id"] in artist_ids
+            })
+        ],
+        ignore_conflicts=True
+    )
+
+    # -------------------------------
+    # Треки
+    # -------------------------------
+
+    Track.objects.bulk_create(
+        [
+            Track(
+                spotify_id=t["id"],
+                name=t["name"],
+                duration_ms=t["duration_ms"],
+                explicit=t["explicit"],
+                popularity=t.get("popularity"),
+                spotify_url=t["external_urls"]["spotify"],
+                album_id=album_ids.get(t["album"]["id"]),
+                release_date=parse_date(t["album"]["release_date"])
+                if t["album"].get("release_date_precision") == "day"
+                else None,
+                image=(
+                    t["album"]["images"][0]["url"]
+                    if t["album"].get("images")
+                    else None
+                ),
+            )
+            for _, t in sorted(tracks_data.items())
+        ],
+        ignore_conflicts=True
+    )
+
+    track_ids, _ = lookup_ids(Track, "track", tracks_data.keys())
+
+    # -------------------------------
+    # Track ↔ Artist
+    # -------------------------------
+
+    TrackArtist = Track.artists.through
+    TrackArtist.objects.bulk_create(
+        [
+            TrackArtist(track_id=track_id, artist_id=artist_id)
+            for track_id, artist_id in sorted({
+                (track_ids[t["id"]], artist_ids[a["id"]])
+                for t in tracks_data.values()
+                for a in t["artists"]
+                if t["id"] in track_ids and a["id"] in artist_ids
+            })
+        ],
+        ignore_conflicts=True
+    )
+
+    return track_ids
+
+
+def stale_for_enrichment(model, limit):
+    """Rows never enriched first, then the ones enriched longest ago."""
+    stale_before = timezone.now() - settings.CATALOG_ENRICH_MAX_AGE
+    return list(
+        model.objects
+        .filter(Q(enriched_at__isnull=True) | Q(enriched_at__lt=stale_before))
+        .order_by(F("enriched_at").asc(nulls_first=True))
+        .only("id", "spotify_id", "name", "image", "popularity")[:limit]
+    )
+
+
+def enrich_artists(service, limit):
+    artists = stale_for_enrichment(Artist, limit)
+    if not artists:
+        return 0
+
+    full = {a["id"]: a for a in service.get_artists([a.spotify_id for a in artists]) if a}
+    now = timezone.now()
+    for artist in artists:
+        data = full.get(artist.spotify_id)
+        if data:
+            artist.name = data["name"]
+            artist.image = data["images"][0]["url"] if data.get("images") else artist.image
+            artist.popularity = data.get("popularity")
+            artist.followers = (data.get("followers") or {}).get("total")
+        # Ids Spotify no longer knows are marked too, so they aren't refetched every run.
+        artist.enriched_at = now
+        artist.updated_at = now
+
+    Artist.objects.bulk_update(
+        artists,
+        ["name", "image", "popularity", "followers", "enriched_at", "updated_at"],
+    )
+    return len(artists)
+
+
+def enrich_albums(service, limit):
+    albums = stale_for_enrichment(Album, limit)
+    if not albums:
+        return 0
+
+    full = {a["id"]: a for a in service.get_albums([a.spotify_id for a in albums]) if a}
+    now = timezone.now()
+    for album in albums:
+        data = full.get(album.spotify_id)
+        if data:
+            album.name = data["name"]
+            album.image = data["images"][0]["url"] if data.get("images") else album.image
+            album.popularity = data.get("popularity")
+        album.enriched_at = now
+        album.updated_at = now
+
+    Album.objects.bulk_update(
+        albums,
+        ["name", "image", "popularity", "enriched_at", "updated_at"],
+    )
+    return len(albums)
@@ -0,0 +1,212 @@
+import asyncio
+import atexit
+import json
+import os
+import threading
+from urllib.parse import urlsplit
+
+import aiohttp
+from django.conf import settings
+from tenacity import AsyncRetrying, retry_if_exception_type, stop_after_attempt, wait_exponential
+
+from spotify_analytics.spotify.ratelimit import rate_limiter
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class RequestCounter:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def increment(self):
+        with self._lock:
+            self.value += 1
+
+
+request_counter = RequestCounter()
+
+
+class SpotifyResponse:
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    @property
+    def text(self):
+        return self.content.decode(errors="replace")
+
+    def json(self):
+        return json.loads(self.content) if self.content else None
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise SpotifyAPIError(self)
+
+
+class SpotifyAPIError(Exception):
+    def __init__(self, response):
+        self.response = response
+        super().__init__(f"Spotify API returned {response.status_code}: {response.text[:200]}")
+
+
+def retry_after(response):
+    value = response.headers.get("Retry-After")
+    return int(value) if value and value.isdigit() else None
+
+
+class RetryableResponse(Exception):
+    def __init__(self, response):
+        self.response = response
+        self.retry_after = retry_after(response)
+
+
+def endpoint_name(url):
+    """``https://api.spotify.com/v1/me/top/tracks`` -> ``me/top/tracks``"""
+    path = urlsplit(url).path
+    api_path = urlsplit(settings.SPOTIFY_API_URL).path
+    return path.removeprefix(api_path).strip("/")
+
+
+def _retry_wait(retry_state):
+    error = retry_state.outcome.exception()
+    if isinstance(error, RetryableResponse) and error.retry_after is not None:
+        return error.retry_after
+    return wait_exponential(multiplier=0.5, max=10)(retry_state)
+
+
+class AsyncSpotifyClient:
+    """
+    Spotify HTTP client on a single keep-alive connection pool with a cap
+    on in-flight requests. Transport errors, 429 and 5xx are retried,
+    honouring Retry-After.
+    """
+
+    def __init__(self, max_connections=None, max_concurrency=None):
+        self.max_connections = max_connections or settings.SPOTIFY_MAX_CONNECTIONS
+        self.max_concurrency = max_concurrency or settings.SPOTIFY_MAX_CONCURRENCY
+        self._session = None
+        self._semaphore = None
+
+    async def session(self):
+        if self._session is None or self._session.closed:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.max_connections,
+                    keepalive_timeout=60,
+                    ttl_dns_cache=300,
+                ),
+                timeout=aiohttp.ClientTimeout(total=settings.SPOTIFY_REQUEST_TIMEOUT),
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+    async def request(self, method, url, params=None, **kwargs):
+        if params:
+            params = {key: value for key, value in params.items() if value is not None}
+
+        retrying = AsyncRetrying(
+            reraise=True,
+            stop=stop_after_attempt(settings.SPOTIFY_MAX_RETRIES + 1),
+            wait=_retry_wait,
+            retry=retry_if_exception_type((RetryableResponse, aiohttp.ClientError, asyncio.TimeoutError)),
+        )
+        try:
+            async for attempt in retrying:
+                with attempt:
+                    return await self._send(method, url, params=params, **kwargs)
+        except RetryableResponse as e:
+            return e.response
+
+    async def _send(self, method, url, **kwargs):
+        session = await self.session()
+        endpoint = endpoint_name(url)
+        if url.startswith(settings.SPOTIFY_API_URL):
+            await rate_limiter.acquire()
+
+        async with self._semaphore:
+            request_counter.increment()
+            async with session.request(method, url, **kwargs) as r:
+                response = SpotifyResponse(r.status, r.headers, await r.read())
+
+        throttled = response.status_code == 429
+        await asyncio.to_thread(
+            rate_limiter.record,
+            endpoint,
+            throttled=throttled,
+            retry_after=retry_after(response) if throttled else None,
+        )
+
+        if response.status_code in RETRY_STATUSES:
+            raise RetryableResponse(response)
+        return response
+
+    async def get_many(self, url, key, ids, batch_size=50, **kwargs):
+        """
+        Fetch ``ids`` through a several-ids endpoint (``/tracks?ids=``)
+        in concurrent batches and return the ``key`` items in input order.
+        """
+        batches = [ids[i:i + batch_size] for i in range(0, len(ids), batch_size)]
+        responses = await asyncio.gather(*(
+            self.request("GET", url, params={"ids": ",".join(batch)}, **kwargs)
+            for batch in batches
+        ))
+
+        items = []
+        for response in responses:
+            response.raise_for_status()
+            items.extend(response.json().get(key, []))
+        return items
+
+
+class SpotifyClient:
+    """
+    Synchronous facade over AsyncSpotifyClient. Coroutines run on one
+    background event loop per process, so the connection pool is shared by
+    every caller and thread in that process (and recreated after a fork).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._loop = None
+        self._client = None
+
+    def _ensure_loop(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=self._loop.run_forever,
+                name="spotify-client",
+                daemon=True,
+            ).start()
+            self._client = AsyncSpotifyClient()
+            self._pid = os.getpid()
+            atexit.register(self.close)
+
+    def run(self, make_coroutine):
+        self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(make_coroutine(self._client), self._loop)
+        return future.result()
+
+    def close(self):
+        if self._pid == os.getpid():
+            asyncio.run_coroutine_threadsafe(self._client.close(), self._loop).result()
+
+    def request(self, method, url, **kwargs):
+        return self.run(lambda client: client.request(method, url, **kwargs))
+
+    def get_many(self, url, key, ids, **kwargs):
+        return self.run(lambda client: client.get_many(url, key, ids, **kwargs))
+
+
+spotify_client = SpotifyClient()
@@ -0,0 +1,186 @@
+import json
+import logging
+import time
+
+from django.conf import settings
+from django_redis import get_redis_connection
+
+from spotify_analytics.spotify.stats import MinuteCounters
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 50
+POLL_INTERVAL = 0.1
+MISSING = "-"
+
+# Queue ids nobody has fetched or is fetching yet.
+ENQUEUE_SCRIPT = """
+local added = 0
+for i = 2, #ARGV do
+    local sid = ARGV[i]
+    if redis.call("EXISTS", ARGV[1] .. "result:" .. sid, ARGV[1] .. "claim:" .. sid) == 0 then
+        added = added + redis.call("SADD", KEYS[1], sid)
+    end
+end
+return added
+"""
+
+# Pop up to ARGV[2] queued ids and claim them for ARGV[3] milliseconds.
+CLAIM_SCRIPT = """
+local ids = redis.call("SPOP", KEYS[1], ARGV[2])
+for _, sid in ipairs(ids) do
+    redis.call("SET", ARGV[1] .. "claim:" .. sid, 1, "PX", ARGV[3])
+end
+return ids
+"""
+
+# Drop the claims on ARGV[2..] and queue the ids in ARGV[2..] that belong
+# to other jobs again.
+RELEASE_SCRIPT = """
+local requeue = tonumber(ARGV[2])
+for i = 3, #ARGV do
+    redis.call("DEL", ARGV[1] .. "claim:" .. ARGV[i])
+    if i - 2 <= requeue then
+        redis.call("SADD", KEYS[1], ARGV[i])
+    end
+end
+return requeue
+"""
+
+
+class TrackFetchCoalescer:
+    """
+    Collects the track ids every running import is missing into one Redis
+    set. Each waiting job pops full 50-id batches from it, whoever they
+    belong to, fetches them and publishes the payloads for a few minutes;
+    meanwhile it picks up its own ids from what the other jobs published.
+    A track several imports want at once is fetched once.
+
+    Ids claimed by a worker that died are fetched directly once
+    SPOTIFY_COALESCE_WAIT runs out.
+    """
+
+    prefix = "spotify:coalesce:track:"
+
+    def __init__(self, alias="default"):
+        self.alias = alias
+        self.counters = MinuteCounters("spotify:coalesce:stats", alias)
+        self._scripts = {}
+
+    @property
+    def enabled(self):
+        return settings.SPOTIFY_COALESCE_FETCHES
+
+    @property
+    def redis(self):
+        return get_redis_connection(self.alias)
+
+    def _script(self, source):
+        if source not in self._scripts:
+            self._scripts[source] = self.redis.register_script(source)
+        return self._scripts[source]
+
+    def fetch(self, service, spotify_ids):
+        """Return ``{spotify_id: track payload}`` for the ids Spotify knows."""
+        if not self.enabled:
+            return {t["id"]: t for t in service.get_tracks(list(spotify_ids)) if t}
+
+        wanted = set(spotify_ids)
+        results = {}
+        self.counters.incr({"requested": len(wanted)})
+
+        results.update(self._collect(wanted))
+        wanted -= results.keys()
+        if wanted:
+            self._script(ENQUEUE_SCRIPT)(keys=[f"{self.prefix}pending"], args=[self.prefix, *wanted])
+
+        deadline = time.monotonic() + settings.SPOTIFY_COALESCE_WAIT
+        while wanted and time.monotonic() < deadline:
+            claimed = self._claim()
+            if claimed:
+                try:
+                    self._fetch_and_publish(service, claimed)
+                except Exception:
+                    # The batch may hold other jobs' ids: hand them back
+                    # instead of failing this job for them or leaving their
+                    # owners to wait out the claim. This job's own ids go
+                    # through the fallback below, which may raise.
+                    logger.warning("Coalesced fetch of %s tracks failed", len(claimed), exc_info=True)
+                    self._release(claimed, wanted)
+                    break
+            else:
+                time.sleep(POLL_INTERVAL)
+
+            ready = self._collect(wanted)
+            results.update(ready)
+            wanted -= ready.keys()
+
+        if wanted:
+            self.counters.incr({"fallback": len(wanted)})
+            results.update(self._fetch_and_publish(service, list(wanted)))
+
+        return {sid: t for sid, t in results.items() if t != MISSING}
+
+    def _claim(self):
+        return [
+            sid.decode()
+            for sid in self._script(CLAIM_SCRIPT)(
+                keys=[f"{self.prefix}pending"],
+                args=[
+                    self.prefix,
+                    BATCH_SIZE * settings.SPOTIFY_MAX_CONCURRENCY,
+                    settings.SPOTIFY_COALESCE_WAIT * 1000,
+                ],
+            )
+        ]
+
+    def _release(self, claimed, wanted):
+        others = [sid for sid in claimed if sid not in wanted]
+        self._script(RELEASE_SCRIPT)(
+            keys=[f"{self.prefix}pending"],
+            args=[self.prefix, len(others), *others, *(sid for sid in claimed if sid in wanted)],
+        )
+
+    def _fetch_and_publish(self, service, spotify_ids):
+        tracks = {t["id"]: t for t in service.get_tracks(spotify_ids) if t}
+        published = {sid: tracks.get(sid, MISSING) for sid in spotify_ids}
+
+        pipe = self.redis.pipeline()
+        for sid, track in published.items():
+            pipe.set(
+                f"{self.prefix}result:{sid}",
+                json.dumps(track),
+                ex=settings.SPOTIFY_COALESCE_RESULT_TTL,
+            )
+            pipe.delete(f"{self.prefix}claim:{sid}")
+        self.counters.incr(
+            {"fetched": len(spotify_ids), "requests": -(-len(spotify_ids) // BATCH_SIZE)},
+            pipe,
+        )
+        pipe.execute()
+        return published
+
+    def _collect(self, spotify_ids):
+        spotify_ids = list(spotify_ids)
+        values = self.redis.mget([f"{self.prefix}result:{sid}" for sid in spotify_ids])
+        return {
+            sid: json.loads(value)
+            for sid, value in zip(spotify_ids, values)
+            if value is not None
+        }
+
+    def stats(self, minutes=60):
+        """
+        Per-minute ``requested`` (ids jobs asked for), ``fetched`` (ids sent
+        to Spotify), ``requests``, ``fallback`` and the coalescing ratio
+        ``requested / fetched``.
+        """
+        result = []
+        for minute_start, counters in self.counters.read(minutes):
+            counters = {"requested": 0, "fetched": 0, "requests": 0, "fallback": 0} | counters
+            counters["ratio"] = round(counters["requested"] / counters["fetched"], 2) if counters["fetched"] else None
+            result.append((minute_start, counters))
+        return result
+
+
+track_coalescer = TrackFetchCoalescer()
@@ -0,0 +1,82 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from aiohttp import web
+from django.core.management.base import BaseCommand
+
+from spotify_analytics.spotify.client import spotify_client
+
+BATCH_SIZE = 50
+
+
+def start_stub_server(latency):
+    """
+    Serve a minimal ``GET /tracks?ids=`` on a random local port from a
+    background thread and return its base URL.
+    """
+    async def tracks(request):
+        await asyncio.sleep(latency)
+        ids = request.query["ids"].split(",")
+        return web.json_response({"tracks": [{"id": sid} for sid in ids]})
+
+    started = threading.Event()
+    address = {}
+
+    async def serve():
+        app = web.Application()
+        app.router.add_get("/tracks", tracks)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        address["url"] = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+        started.set()
+        await asyncio.Event().wait()
+
+    threading.Thread(target=asyncio.run, args=(serve(),), daemon=True).start()
+    started.wait()
+    return address["url"]
+
+
+def fetch_with_threads(base_url, ids, max_workers):
+    # The previous path: one fresh connection per batch, a few threads.
+    def fetch_batch(batch):
+        r = requests.get(f"{base_url}/tracks", params={"ids": ",".join(batch)}, timeout=10)
+        r.raise_for_status()
+        return r.json().get("tracks", [])
+
+    batches = [ids[i:i + BATCH_SIZE] for i in range(0, len(ids), BATCH_SIZE)]
+    tracks = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for result in executor.map(fetch_batch, batches):
+            tracks.extend(result)
+    return tracks
+
+
+class Command(BaseCommand):
+    help = "Compare catalog fetch throughput of the thread-pool and pooled async Spotify clients on a local stub."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tracks", type=int, default=20_000)
+        parser.add_argument("--latency-ms", type=int, default=50)
+        parser.add_argument("--workers", type=int, default=3)
+
+    def handle(self, *args, tracks, latency_ms, workers, **options):
+        base_url = start_stub_server(latency_ms / 1000)
+        ids = [f"{i:022d}" for i in range(tracks)]
+
+        runs = (
+            (f"threads x{workers}", lambda: fetch_with_threads(base_url, ids, workers)),
+            ("async pool", lambda: spotify_client.get_many(f"{base_url}/tracks", "tracks", ids)),
+        )
+        for label, fetch in runs:
+            started_at = time.monotonic()
+            fetched = fetch()
+            elapsed = time.monotonic() - started_at
+            self.stdout.write(
+                f"{label:>12}: {len(fetched)} tracks in {elapsed:.2f}s "
+                f"({len(fetched) / elapsed:,.0f} tracks/s)"
+            )
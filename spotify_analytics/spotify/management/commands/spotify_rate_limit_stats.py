@@ -0,0 +1,21 @@
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand
+
+from spotify_analytics.spotify.ratelimit import rate_limiter
+
+
+class Command(BaseCommand):
+    help = "Show Spotify requests and 429s per endpoint and minute, as counted by the shared rate limiter."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--minutes", type=int, default=15)
+
+    def handle(self, *args, minutes, **options):
+        for minute_start, endpoints in rate_limiter.stats(minutes):
+            minute = datetime.fromtimestamp(minute_start, tz=timezone.utc)
+            for endpoint, counters in sorted(endpoints.items()):
+                self.stdout.write(
+                    f"{minute:%Y-%m-%d %H:%M}  {endpoint:<32} "
+                    f"{counters['requests']:>7} requests {counters['throttled']:>5} throttled"
+                )
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:32
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecentlyPlayedCursor',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(blank=True, default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(blank=True, default=django.utils.timezone.now)),
+                ('after', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('synced_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('listens_added', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='recently_played_cursor', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('spotify_api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recentlyplayedcursor',
+            name='queued_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,3 +1,21 @@
+from django.conf import settings
 from django.db import models
 
-# Create your models here.
+from spotify_analytics.core.models import UUIDModel, TimestampedModel
+
+
+class RecentlyPlayedCursor(UUIDModel, TimestampedModel):
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="recently_played_cursor"
+    )
+    # Unix ms of the newest listen synced so far; the next sync asks for
+    # plays after it.
+    after = models.PositiveBigIntegerField(null=True, blank=True)
+    synced_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    # When the user's last sync was enqueued; it's still pending until
+    # synced_at catches up.
+    queued_at = models.DateTimeField(null=True, blank=True)
+    listens_added = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default="")
@@ -0,0 +1,106 @@
+import asyncio
+
+from django.conf import settings
+from django_redis import get_redis_connection
+
+from spotify_analytics.spotify.stats import MinuteCounters
+
+# Refills the bucket from the time elapsed since the last call and takes one
+# token. Returns 0 when a token was taken, otherwise how many milliseconds to
+# wait: until the next token, or until a broadcast Retry-After pause ends.
+TOKEN_BUCKET_SCRIPT = """
+local bucket, pause = KEYS[1], KEYS[2]
+local rate, capacity = tonumber(ARGV[1]), tonumber(ARGV[2])
+
+local paused = redis.call("PTTL", pause)
+if paused > 0 then
+    return paused
+end
+
+local now = redis.call("TIME")
+now = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+
+local state = redis.call("HMGET", bucket, "tokens", "ts")
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate / 1000)
+
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = math.ceil((1 - tokens) * 1000 / rate)
+end
+
+redis.call("HSET", bucket, "tokens", tostring(tokens), "ts", now)
+redis.call("PEXPIRE", bucket, math.ceil(capacity * 1000 / rate) + 1000)
+return wait
+"""
+
+
+class SpotifyRateLimiter:
+    """
+    Token bucket shared by every worker through Redis. Each Web API call
+    takes a token first; a 429 pauses the whole cluster for Retry-After
+    seconds instead of just the worker that got it. Requests and throttles
+    are counted per endpoint and minute.
+    """
+
+    bucket_key = "spotify:ratelimit:bucket"
+    pause_key = "spotify:ratelimit:pause"
+
+    def __init__(self, alias="default"):
+        self.alias = alias
+        self.counters = MinuteCounters("spotify:ratelimit:stats", alias)
+        self._script = None
+
+    @property
+    def enabled(self):
+        return settings.SPOTIFY_RATE_LIMIT_ENABLED
+
+    @property
+    def redis(self):
+        return get_redis_connection(self.alias)
+
+    def try_acquire(self):
+        """Take a token; return 0, or the seconds to wait before trying again."""
+        if self._script is None:
+            self._script = self.redis.register_script(TOKEN_BUCKET_SCRIPT)
+        wait_ms = self._script(
+            keys=[self.bucket_key, self.pause_key],
+            args=[settings.SPOTIFY_RATE_LIMIT_PER_SECOND, settings.SPOTIFY_RATE_LIMIT_BURST],
+        )
+        return wait_ms / 1000
+
+    async def acquire(self):
+        if not self.enabled:
+            return
+        while wait := await asyncio.to_thread(self.try_acquire):
+            await asyncio.sleep(wait)
+
+    def record(self, endpoint, throttled=False, retry_after=None):
+        if not self.enabled:
+            return
+
+        pipe = self.redis.pipeline()
+        self.counters.incr({f"{endpoint}:requests": 1, f"{endpoint}:throttled": int(throttled)}, pipe)
+        if throttled:
+            # Never shorten a pause another worker already announced.
+            pause_ms = int((retry_after or 1) * 1000)
+            if self.redis.pttl(self.pause_key) < pause_ms:
+                pipe.set(self.pause_key, 1, px=pause_ms)
+        pipe.execute()
+
+    def stats(self, minutes=60):
+        """Return ``[(minute_start, {endpoint: {"requests": n, "throttled": n}})]``, oldest first."""
+        result = []
+        for minute_start, counters in self.counters.read(minutes):
+            endpoints = {}
+            for field, value in counters.items():
+                endpoint, counter = field.rsplit(":", 1)
+                endpoints.setdefault(endpoint, {"requests": 0, "throttled": 0})[counter] = value
+            result.append((minute_start, endpoints))
+        return result
+
+
+rate_limiter = SpotifyRateLimiter()
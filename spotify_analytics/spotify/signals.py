@@ -0,0 +1,10 @@
+from allauth.socialaccount.models import SocialToken
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from spotify_analytics.spotify.tokens import token_manager
+
+
+@receiver([post_save, post_delete], sender=SocialToken)
+def invalidate_cached_user_token(sender, instance, **kwargs):
+    token_manager.invalidate_user(instance.account.user_id)
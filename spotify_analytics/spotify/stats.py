@@ -0,0 +1,41 @@
+import time
+
+from django_redis import get_redis_connection
+
+STATS_TTL = 24 * 60 * 60
+
+
+class MinuteCounters:
+    """Named counters kept in one Redis hash per minute for a day."""
+
+    def __init__(self, prefix, alias="default"):
+        self.prefix = prefix
+        self.alias = alias
+
+    def key(self, minute):
+        return f"{self.prefix}:{minute}"
+
+    def incr(self, counts, pipe=None):
+        redis = pipe if pipe is not None else get_redis_connection(self.alias).pipeline()
+        key = self.key(int(time.time() // 60))
+        for field, amount in counts.items():
+            if amount:
+                redis.hincrby(key, field, amount)
+        redis.expire(key, STATS_TTL)
+        if pipe is None:
+            redis.execute()
+
+    def read(self, minutes=60):
+        """Return ``[(minute_start, {field: count})]`` for non-empty minutes, oldest first."""
+        current = int(time.time() // 60)
+        minute_range = range(current - minutes + 1, current + 1)
+
+        pipe = get_redis_connection(self.alias).pipeline()
+        for minute in minute_range:
+            pipe.hgetall(self.key(minute))
+
+        return [
+            (minute * 60, {field.decode(): int(value) for field, value in counters.items()})
+            for minute, counters in zip(minute_range, pipe.execute())
+            if counters
+        ]
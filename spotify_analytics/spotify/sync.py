@@ -0,0 +1,168 @@
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from spotify_analytics.analytics.rollups import refresh_rollups
+from spotify_analytics.core.loaders import bulk_load
+from spotify_analytics.core.models import ListeningHistory, listening_dedup_key
+from spotify_analytics.core.partitions import ensure_partitions
+from spotify_analytics.spotify.catalog import resolve_tracks
+from spotify_analytics.spotify.models import RecentlyPlayedCursor
+from spotify_analytics.spotify.services import SpotifyService
+
+PAGE_SIZE = 50
+MAX_PAGES = 5
+
+API_HISTORY_FIELDS = (
+    "user_id",
+    "track_id",
+    "played_at",
+    "ms_played",
+    "dedup_key",
+    "source",
+)
+
+
+class RecentlyPlayedError(Exception):
+    pass
+
+
+def fetch_recently_played(service, after):
+    """
+    Return the items played after ``after`` (unix ms) and the new cursor.
+    The endpoint only remembers the last 50 plays, so a few pages cover
+    anything missed between syncs.
+    """
+    items = []
+    for _ in range(MAX_PAGES):
+        data = service.get_recently_played(limit=PAGE_SIZE, after=after)
+        if "error" in data:
+            raise RecentlyPlayedError(data["details"])
+
+        page = data.get("items") or []
+        if not page:
+            break
+        items.extend(page)
+        after = int(data["cursors"]["after"])
+        if not data.get("next"):
+            break
+    return items, after
+
+
+def match_window():
+    return timedelta(seconds=settings.LISTEN_MATCH_TOLERANCE)
+
+
+def unrecorded(user_id, rows):
+    """
+    Drop the ``rows`` whose play is already recorded: a listen of the same
+    track within LISTEN_MATCH_TOLERANCE, typically imported from an export,
+    whose second-precision ts and real ms_played never give the same
+    dedup_key as the API's played_at.
+    """
+    if not rows:
+        return rows
+    tolerance = match_window()
+    recorded = {}
+    for track_id, played_at in (
+        ListeningHistory.objects
+        .filter(
+            user_id=user_id,
+            track_id__in={row[1] for row in rows},
+            played_at__gte=min(row[2] for row in rows) - tolerance,
+            played_at__lte=max(row[2] for row in rows) + tolerance,
+        )
+        .values_list("track_id", "played_at")
+    ):
+        recorded.setdefault(track_id, []).append(played_at)
+
+    return [
+        row for row in rows
+        if not any(abs(row[2] - played_at) <= tolerance for played_at in recorded.get(row[1], ()))
+    ]
+
+
+def replace_synced_listens(user_id, start, stop):
+    """
+    Delete the user's recently-played listens around ``[start, stop]`` that
+    an export listen of the same track covers (played within
+    LISTEN_MATCH_TOLERANCE); the export row has the real ms_played and
+    flags. Returns how many were deleted.
+    """
+    tolerance = match_window()
+    exported = ListeningHistory.objects.filter(
+        user_id=user_id,
+        source=ListeningHistory.Source.EXPORT,
+        track_id=OuterRef("track_id"),
+        played_at__gte=OuterRef("played_at") - tolerance,
+        played_at__lte=OuterRef("played_at") + tolerance,
+    )
+    return (
+        ListeningHistory.objects
+        .filter(
+            user_id=user_id,
+            source=ListeningHistory.Source.RECENTLY_PLAYED,
+            played_at__gte=start - tolerance,
+            played_at__lte=stop + tolerance,
+        )
+        .filter(Exists(exported))
+        .delete()[0]
+    )
+
+
+def sync_recently_played(user):
+    """Store the user's plays since the last sync; return how many were new."""
+    cursor, _ = RecentlyPlayedCursor.objects.get_or_create(user=user)
+
+    service = SpotifyService(user)
+    if not service.token:
+        cursor.error = "Spotify account is not connected"
+        cursor.synced_at = timezone.now()
+        cursor.save(update_fields=["error", "synced_at", "updated_at"])
+        return 0
+
+    items, after = fetch_recently_played(service, cursor.after)
+    # Local files have no Spotify id and can't be matched to a Track.
+    items = [item for item in items if item["track"].get("id")]
+    tracks_data = {item["track"]["id"]: item["track"] for item in items}
+    for item in items:
+        item["played_at"] = parse_datetime(item["played_at"])
+
+    ensure_partitions({item["played_at"].year for item in items})
+    track_ids = resolve_tracks(service, list(tracks_data), tracks_data)
+
+    with transaction.atomic():
+        rows = []
+        for item in items:
+            sid = item["track"]["id"]
+            if sid not in track_ids:
+                continue
+            played_at = item["played_at"]
+            # The API doesn't report how long a track played; count it in full.
+            ms_played = item["track"]["duration_ms"]
+            rows.append((
+                user.id,
+                track_ids[sid],
+                played_at,
+                ms_played,
+                listening_dedup_key(played_at, sid, ms_played),
+                ListeningHistory.Source.RECENTLY_PLAYED,
+            ))
+        rows = unrecorded(user.id, rows)
+
+        added = bulk_load(ListeningHistory, API_HISTORY_FIELDS, rows, ignore_conflicts=True)
+        if added:
+            refresh_rollups(user.id, {played_at.astimezone(dt_timezone.utc).date() for _, _, played_at, *_ in rows})
+
+        cursor.after = after
+        cursor.synced_at = timezone.now()
+        cursor.listens_added += added
+        cursor.error = ""
+        cursor.updated_at = cursor.synced_at
+        cursor.save()
+
+    return added
@@ -0,0 +1,94 @@
+from datetime import timedelta
+
+from allauth.socialaccount.models import SocialAccount
+from celery import shared_task
+from celery.utils.log import get_task_logger
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import F, Q
+from django.utils import timezone
+
+from spotify_analytics.spotify.catalog import enrich_albums, enrich_artists
+from spotify_analytics.spotify.models import RecentlyPlayedCursor
+from spotify_analytics.spotify.services import SpotifyService
+from spotify_analytics.spotify.sync import sync_recently_played
+
+logger = get_task_logger(__name__)
+
+
+@shared_task(bind=True)
+def enrich_catalog(self):
+    """
+    Fill in artist and album fields the /tracks payload doesn't carry
+    (images, popularity, followers), for rows never enriched or older than
+    CATALOG_ENRICH_MAX_AGE. Each run handles at most CATALOG_ENRICH_BATCH
+    rows of each so it stays well inside the shared rate limit.
+    """
+    service = SpotifyService()
+    artists = enrich_artists(service, settings.CATALOG_ENRICH_BATCH)
+    albums = enrich_albums(service, settings.CATALOG_ENRICH_BATCH)
+    logger.info("Enriched %s artists and %s albums", artists, albums)
+    return {"artists": artists, "albums": albums}
+
+
+@shared_task(bind=True)
+def schedule_recently_played_sync(self):
+    """
+    Split users with a connected Spotify account into batches of
+    RECENTLY_PLAYED_SYNC_BATCH, least recently synced first, and space the
+    batches so their requests fit RECENTLY_PLAYED_SYNC_RATE_SHARE of the
+    shared rate limit. Users whose last sync is still pending are skipped,
+    and users beyond what one RECENTLY_PLAYED_SYNC_INTERVAL can fit wait
+    for the next run, which stretches their interval instead of overrunning
+    the token bucket.
+    """
+    now = timezone.now()
+    interval = settings.RECENTLY_PLAYED_SYNC_INTERVAL
+    # A sync queued this long ago without finishing is assumed lost.
+    pending = Q(
+        user__recently_played_cursor__queued_at__gt=now - timedelta(seconds=2 * interval)
+    ) & (
+        Q(user__recently_played_cursor__synced_at__isnull=True)
+        | Q(user__recently_played_cursor__synced_at__lt=F("user__recently_played_cursor__queued_at"))
+    )
+
+    rate = settings.SPOTIFY_RATE_LIMIT_PER_SECOND * settings.RECENTLY_PLAYED_SYNC_RATE_SHARE
+    seconds_per_user = settings.RECENTLY_PLAYED_SYNC_REQUESTS_PER_USER / rate
+    user_ids = list(
+        SocialAccount.objects
+        .filter(provider="spotify", socialtoken__isnull=False)
+        .exclude(pending)
+        .order_by(F("user__recently_played_cursor__synced_at").asc(nulls_first=True))
+        .values_list("user_id", flat=True)
+        .distinct()[:int(interval / seconds_per_user)]
+    )
+
+    RecentlyPlayedCursor.objects.bulk_create(
+        [RecentlyPlayedCursor(user_id=user_id) for user_id in user_ids],
+        ignore_conflicts=True,
+    )
+    RecentlyPlayedCursor.objects.filter(user_id__in=user_ids).update(queued_at=now)
+
+    batch_size = settings.RECENTLY_PLAYED_SYNC_BATCH
+    spacing = batch_size * seconds_per_user
+    for i in range(0, len(user_ids), batch_size):
+        sync_recently_played_batch.apply_async(
+            args=[user_ids[i:i + batch_size]],
+            countdown=round(i // batch_size * spacing),
+        )
+
+    return len(user_ids)
+
+
+@shared_task(bind=True)
+def sync_recently_played_batch(self, user_ids):
+    added = 0
+    for user in get_user_model().objects.filter(id__in=user_ids):
+        try:
+            added += sync_recently_played(user)
+        except Exception as e:
+            logger.exception("Recently played sync failed for user %s", user.id)
+            RecentlyPlayedCursor.objects.filter(user=user).update(
+                error=str(e), synced_at=timezone.now()
+            )
+    return added
@@ -0,0 +1,135 @@
+import base64
+import time
+from datetime import timedelta
+
+from allauth.socialaccount.models import SocialToken, SocialApp
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from rest_framework import status
+
+from spotify_analytics.spotify.client import spotify_client
+
+# Tokens are dropped from the cache this long before Spotify expires them.
+EXPIRY_MARGIN = 60
+LOCK_TIMEOUT = 30
+LOCK_WAIT = 10
+LOCK_POLL_INTERVAL = 0.05
+
+
+class TokenManager:
+    """
+    Spotify access tokens cached until shortly before they expire, so the
+    client-credentials token is shared by every process and a user's token
+    is read from the database only when it changes.
+
+    A cache miss is refreshed by a single caller holding ``<key>:lock``;
+    everyone else waits for the token it stores.
+    """
+
+    app_key = "spotify:token:app"
+    user_key = "spotify:token:user:{user_id}"
+
+    def __init__(self, alias="default"):
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def app_token(self):
+        return self._get_or_refresh(self.app_key, self._fetch_app_token)
+
+    def user_token(self, user):
+        return self._get_or_refresh(
+            self.user_key.format(user_id=user.pk),
+            lambda: self._load_user_token(user),
+        )
+
+    def invalidate_user(self, user_id):
+        self.cache.delete(self.user_key.format(user_id=user_id))
+
+    def _get_or_refresh(self, key, fetch):
+        token = self.cache.get(key)
+        if token:
+            return token
+
+        lock_key = f"{key}:lock"
+        deadline = time.monotonic() + LOCK_WAIT
+        while time.monotonic() < deadline:
+            if self.cache.add(lock_key, 1, timeout=LOCK_TIMEOUT):
+                try:
+                    # Whoever held the lock before may have just stored it.
+                    token = self.cache.get(key)
+                    if not token:
+                        token, expires_in = fetch()
+                        if token:
+                            self.cache.set(key, token, timeout=max(expires_in - EXPIRY_MARGIN, 1))
+                    return token
+                finally:
+                    self.cache.delete(lock_key)
+
+            time.sleep(LOCK_POLL_INTERVAL)
+            token = self.cache.get(key)
+            if token:
+                return token
+
+        # The lock holder is stuck; don't make the caller wait any longer.
+        token, _ = fetch()
+        return token
+
+    def _fetch_app_token(self):
+        auth_header = base64.b64encode(f"{settings.SPOTIFY_CLIENT_ID}:{settings.SPOTIFY_CLIENT_SECRET}".encode()).decode()
+        headers = {"Authorization": f"Basic {auth_header}"}
+        data = {"grant_type": "client_credentials"}
+        r = spotify_client.request("POST", f"{settings.SPOTIFY_ACCOUNTS_URL}/api/token", headers=headers, data=data)
+        r.raise_for_status()
+        data = r.json()
+        return data["access_token"], data.get("expires_in", 3600)
+
+    def _load_user_token(self, user):
+        try:
+            token_obj = SocialToken.objects.get(
+                account__user=user,
+                account__provider='spotify'
+            )
+        except SocialToken.DoesNotExist:
+            return None, 0
+
+        if token_obj.expires_at and token_obj.expires_at <= timezone.now() + timedelta(seconds=EXPIRY_MARGIN):
+            if not self._refresh_user_token(token_obj):
+                return None, 0
+
+        if token_obj.expires_at is None:
+            return token_obj.token, 3600
+        return token_obj.token, (token_obj.expires_at - timezone.now()).total_seconds()
+
+    def _refresh_user_token(self, token_obj):
+        try:
+            app = SocialApp.objects.get(provider="spotify")
+        except SocialApp.DoesNotExist:
+            raise Exception("Spotify SocialApp not configured")
+
+        payload = {
+            'grant_type': 'refresh_token',
+            'refresh_token': token_obj.token_secret,
+            'client_id': app.client_id,
+            'client_secret': app.secret,
+        }
+
+        response = spotify_client.request("POST", f"{settings.SPOTIFY_ACCOUNTS_URL}/api/token", data=payload)
+
+        if response.status_code == status.HTTP_200_OK:
+            data = response.json()
+            token_obj.token = data["access_token"]
+            token_obj.expires_at = timezone.now() + timedelta(seconds=data.get('expires_in', 3600))
+
+            if "refresh_token" in data:
+                token_obj.token_secret = data["refresh_token"]
+
+            token_obj.save()
+            return True
+        return False
+
+
+token_manager = TokenManager()
@@ -4,7 +4,8 @@ from spotify_analytics.spotify.views import (
     CurrentUserProfileView,
     UserTopArtistsView,
     UserRecentlyPlayedView,
-    UserTopGenresView, UserTopTracksView
+    UserTopGenresView, UserTopTracksView,
+    SpotifyClientStatsView,
 )
 
 app_name = "spotify"
@@ -14,4 +15,5 @@ urlpatterns = [
     path("top/tracks/", UserTopTracksView.as_view(), name="top_tracks"),
     path("top/artists/", UserTopArtistsView.as_view(), name="top_artists"),
     path("recently-played/", UserRecentlyPlayedView.as_view(), name="recently_played"),
+    path("stats/", SpotifyClientStatsView.as_view(), name="client_stats"),
 ]
\ No newline at end of file
@@ -1,13 +1,17 @@
 from allauth.socialaccount.providers.spotify.views import SpotifyOAuth2Adapter
 from dj_rest_auth.registration.views import SocialLoginView
 from django.db.models import F
-from django.db.models.aggregates import Count, Sum, Min, Max
+from django.db.models.aggregates import Sum, Min, Max
 from rest_framework import views, status
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 
+from spotify_analytics.analytics.models import TrackRollup
 from spotify_analytics.core.clients import CustomOauth2Client
-from spotify_analytics.core.models import ListeningHistory
+from spotify_analytics.core.models import Track
+from spotify_analytics.core.params import minutes_param
+from spotify_analytics.spotify.coalescing import track_coalescer
+from spotify_analytics.spotify.ratelimit import rate_limiter
 from spotify_analytics.spotify.services import SpotifyService
 
 
@@ -48,23 +52,29 @@ class UserTopTracksView(views.APIView):
         items = data["items"]
         spotify_ids = [item["id"] for item in items]
 
+        track_ids = dict(
+            Track.objects
+            .filter(spotify_id__in=spotify_ids)
+            .values_list("id", "spotify_id")
+        )
+
         stats_qs = (
-            ListeningHistory.objects
+            TrackRollup.objects
             .filter(
                 user=request.user,
-                spotify_track_id__in=spotify_ids
+                track_id__in=track_ids
             )
-            .values("spotify_track_id")
-            .annotate(
-                plays=Count("id"),
-                total_ms=Sum("ms_played"),
-                first_listened_at=Min("played_at"),
-                last_listened_at=Max("played_at"),
+            .values(
+                "track_id",
+                plays=F("streams"),
+                total_ms=F("ms_played"),
+                first_listened_at=F("first_played_at"),
+                last_listened_at=F("last_played_at"),
             )
         )
 
         stats_map = {
-            s["spotify_track_id"]: s
+            track_ids[s["track_id"]]: s
             for s in stats_qs
         }
 
@@ -109,17 +119,17 @@ class UserTopArtistsView(views.APIView):
         artist_ids = [item["id"] for item in items]
 
         stats_qs = (
-            ListeningHistory.objects
+            TrackRollup.objects
             .filter(
                 user=request.user,
                 track__artists__spotify_id__in=artist_ids
             )
             .values(artist_spotify_id=F("track__artists__spotify_id"))
             .annotate(
-                plays=Count("id"),
+                plays=Sum("streams"),
                 total_ms=Sum("ms_played"),
-                first_listened_at=Min("played_at"),
-                last_listened_at=Max("played_at"),
+                first_listened_at=Min("first_played_at"),
+                last_listened_at=Max("last_played_at"),
             )
         )
 
@@ -180,3 +190,21 @@ class UserTopGenresView(views.APIView):
             return Response({"error": "Spotify API Error"}, status=status.HTTP_400_BAD_REQUEST)
 
         return Response(data)
+
+
+class SpotifyClientStatsView(views.APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        try:
+            minutes = minutes_param(request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        def per_minute(stats):
+            return [{"minute": minute, **counters} for minute, counters in stats]
+
+        return Response({
+            "rate_limit": per_minute(rate_limiter.stats(minutes)) if rate_limiter.enabled else [],
+            "coalescing": per_minute(track_coalescer.stats(minutes)) if track_coalescer.enabled else [],
+        })